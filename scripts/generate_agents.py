@@ -77,7 +77,8 @@ def collect_skills() -> list[dict[str, str]]:
             script_names = []
             if scripts_dir.exists():
                 script_names = sorted(
-                    f.name for f in scripts_dir.iterdir() if f.suffix == ".py"
+                    f.name for f in scripts_dir.iterdir()
+                    if f.suffix == ".py" and not f.name.startswith("_")
                 )
             skills.append(
                 {
@@ -19,6 +19,12 @@ fi
 
 EXIT_CODE=0
 
+echo "==> Syncing shared script modules into skills..."
+if ! python3 scripts/sync_shared_modules.py $CHECK_FLAG; then
+    EXIT_CODE=1
+fi
+
+echo ""
 echo "==> Generating AGENTS.md and README.md skills table..."
 if ! python3 scripts/generate_agents.py $CHECK_FLAG; then
     EXIT_CODE=1
@@ -0,0 +1,250 @@
+"""
+Shared two-layer response cache for chat completions (v2 SDK)
+
+Layer 1 matches the normalized request JSON exactly (keys sorted, None
+values dropped, surrounding whitespace stripped). Layer 2 is optional:
+given an `embed` function it embeds the final user message and reuses a
+cached response whose prompt is at least `similarity_threshold` cosine
+similar, provided everything else in the request (model, parameters,
+earlier messages) is identical.
+
+Entries live in SQLite with a TTL and an LRU size cap; `stats()` reports
+hit rate and the model latency saved by hits. Streaming requests bypass
+the cache.
+
+    from _response_cache import ResponseCache, embedder
+
+    cache = ResponseCache("responses.sqlite", ttl=3600, embed=embedder(get_client()))
+    response = cache.create(get_client().chat.completions.create, model=..., messages=[...])
+
+Canonical copy: scripts/shared/_response_cache.py. It is copied into
+every skill whose scripts import it by scripts/sync_shared_modules.py
+(run from ./scripts/publish.sh) — edit the canonical copy, not the
+per-skill copies.
+
+Requires:
+    pip install together
+    pip install numpy  # semantic layer only
+"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Callable
+
+from together.types import ChatCompletion
+
+# Same default model as the embeddings skill's embed_texts.
+EMBEDDING_MODEL = "BAAI/bge-base-en-v1.5"
+
+
+def _plain(value):
+    """JSON-ready copy of a request value; SDK objects (e.g. assistant messages) are dumped."""
+    if hasattr(value, "model_dump"):
+        value = value.model_dump(exclude_none=True)
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items() if v is not None}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def _hash(value) -> str:
+    encoded = json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def request_key(request: dict) -> str:
+    """Exact-match key: sha256 of the normalized request JSON."""
+    return _hash(_plain(request))
+
+
+def split_prompt(request: dict) -> tuple[str | None, str | None]:
+    """Return (key of everything but the final user message, that message's text).
+
+    (None, None) when the request does not end in a plain-text user
+    message, e.g. mid tool loop; such requests only use the exact layer.
+    """
+    normalized = _plain(request)
+    messages = normalized.get("messages") or []
+    last = messages[-1] if messages else {}
+    if last.get("role") != "user" or not isinstance(last.get("content"), str):
+        return None, None
+    return _hash(dict(normalized, messages=messages[:-1])), last["content"]
+
+
+def embedder(client, model: str = EMBEDDING_MODEL) -> Callable[[list[str]], list[list[float]]]:
+    """Semantic-layer `embed` function backed by a Together client's embeddings endpoint."""
+
+    def embed(texts: list[str]) -> list[list[float]]:
+        response = client.embeddings.create(model=model, input=texts)
+        return [item.embedding for item in response.data]
+
+    return embed
+
+
+class ResponseCache:
+    """SQLite-backed exact + semantic cache of chat completion responses.
+
+    At most `max_entries` responses are kept, evicting the least recently
+    used; entries older than `ttl` seconds are ignored and purged.
+    `embed` maps a list of texts to a list of vectors (see `embedder`);
+    without it only exact matches are served.
+    """
+
+    def __init__(
+        self,
+        path: str = ":memory:",
+        ttl: float | None = 24 * 3600,
+        max_entries: int = 10_000,
+        embed: Callable[[list[str]], list[list[float]]] | None = None,
+        similarity_threshold: float = 0.95,
+        response_type=ChatCompletion,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.embed = embed
+        self.similarity_threshold = similarity_threshold
+        self.response_type = response_type
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_latency = 0.0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY, context_key TEXT, embedding BLOB,
+                response TEXT NOT NULL, latency REAL NOT NULL,
+                created REAL NOT NULL, accessed REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_context ON responses (context_key);
+            CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+        """)
+
+    def _oldest_valid(self, now: float) -> float:
+        return now - self.ttl if self.ttl is not None else float("-inf")
+
+    def _touch(self, key: str, now: float):
+        with self._db:
+            self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+
+    def _lookup_exact(self, key: str) -> tuple[str, float] | None:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT response, latency FROM responses WHERE key = ? AND created >= ?",
+                (key, self._oldest_valid(now)),
+            ).fetchone()
+            if row:
+                self._touch(key, now)
+                self.exact_hits += 1
+                self.saved_latency += row[1]
+        return row
+
+    def _lookup_semantic(self, context_key: str, embedding) -> tuple[str, float] | None:
+        import numpy as np
+
+        now = time.time()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, embedding, response, latency FROM responses "
+                "WHERE context_key = ? AND embedding IS NOT NULL AND created >= ?",
+                (context_key, self._oldest_valid(now)),
+            ).fetchall()
+            if not rows:
+                return None
+            matrix = np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+            scores = matrix @ embedding
+            best = int(np.argmax(scores))
+            if scores[best] < self.similarity_threshold:
+                return None
+            key, _, response, latency = rows[best]
+            self._touch(key, now)
+            self.semantic_hits += 1
+            self.saved_latency += latency
+        return response, latency
+
+    def _embed(self, text: str):
+        import numpy as np
+
+        vector = np.asarray(self.embed([text])[0], dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _store(self, key: str, context_key: str | None, embedding, response, latency: float):
+        now = time.time()
+        blob = embedding.tobytes() if embedding is not None else None
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, context_key, blob, response.model_dump_json(exclude_unset=True), latency, now, now),
+            )
+            self._db.execute("DELETE FROM responses WHERE created < ?", (self._oldest_valid(now),))
+            (count,) = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()
+            if count > self.max_entries:
+                self._db.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY accessed LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+                self.evictions += count - self.max_entries
+            self.misses += 1
+
+    def lookup(self, request: dict):
+        """Return (response or None, cache state needed by `store`)."""
+        key = request_key(request)
+        hit = self._lookup_exact(key)
+        context_key, prompt, embedding = None, None, None
+        if hit is None and self.embed is not None:
+            context_key, prompt = split_prompt(request)
+            if prompt is not None:
+                embedding = self._embed(prompt)
+                hit = self._lookup_semantic(context_key, embedding)
+        # construct() rebuilds nested models without validation, as the SDK does for live responses.
+        response = self.response_type.construct(**json.loads(hit[0])) if hit else None
+        return response, (key, context_key, embedding)
+
+    def create(self, create_fn: Callable, **request):
+        """Return a cached response for `request`, or call `create_fn(**request)` and cache it."""
+        if request.get("stream"):
+            return create_fn(**request)
+        response, state = self.lookup(request)
+        if response is not None:
+            return response
+        started = time.perf_counter()
+        response = create_fn(**request)
+        self._store(*state, response, time.perf_counter() - started)
+        return response
+
+    async def acreate(self, create_fn: Callable, **request):
+        """Async variant of `create`; lookups (and embedding calls) run in a worker thread."""
+        if request.get("stream"):
+            return await create_fn(**request)
+        response, state = await asyncio.to_thread(self.lookup, request)
+        if response is not None:
+            return response
+        started = time.perf_counter()
+        response = await create_fn(**request)
+        self._store(*state, response, time.perf_counter() - started)
+        return response
+
+    def stats(self) -> dict:
+        hits = self.exact_hits + self.semantic_hits
+        total = hits + self.misses
+        with self._lock:
+            (entries,) = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": hits / total if total else 0.0,
+            "saved_latency_s": round(self.saved_latency, 3),
+            "entries": entries,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Copy shared script modules from scripts/shared/ into the skills that use them.
+
+Usage:
+    python scripts/sync_shared_modules.py              # Sync copies
+    python scripts/sync_shared_modules.py --check      # Check if copies are up-to-date
+
+Skills are installed individually, so a module shared by several skills'
+scripts is vendored into each skills/together-*/scripts/ directory whose
+scripts import it. scripts/shared/ is the source of truth.
+"""
+from __future__ import annotations
+
+import re
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+SHARED_DIR = REPO_ROOT / "scripts" / "shared"
+SKILLS_DIR = REPO_ROOT / "skills"
+
+
+def skills_importing(module: str) -> set[Path]:
+    """Return the scripts/ directories containing a script that imports `module`."""
+    import_re = re.compile(rf"^\s*(from|import)\s+{re.escape(module)}\b", re.MULTILINE)
+    found: set[Path] = set()
+    for script in SKILLS_DIR.glob("together-*/scripts/*.py"):
+        if script.stem != module and import_re.search(script.read_text(encoding="utf-8")):
+            found.add(script.parent)
+    return found
+
+
+def main() -> int:
+    check_mode = "--check" in sys.argv
+    errors: list[str] = []
+    synced = 0
+
+    for source in sorted(SHARED_DIR.glob("*.py")):
+        content = source.read_text(encoding="utf-8")
+        targets = skills_importing(source.stem)
+
+        for scripts_dir in sorted(targets):
+            copy = scripts_dir / source.name
+            rel = copy.relative_to(REPO_ROOT)
+            if copy.exists() and copy.read_text(encoding="utf-8") == content:
+                continue
+            if check_mode:
+                errors.append(f"FAIL: {rel} is missing or out of date")
+            else:
+                copy.write_text(content, encoding="utf-8")
+                print(f"Synced {rel}")
+                synced += 1
+
+        # Copies left behind in skills that no longer import the module
+        for copy in SKILLS_DIR.glob(f"together-*/scripts/{source.name}"):
+            if copy.parent not in targets:
+                rel = copy.relative_to(REPO_ROOT)
+                if check_mode:
+                    errors.append(f"FAIL: {rel} is not imported by any script in that skill")
+                else:
+                    copy.unlink()
+                    print(f"Removed {rel}")
+
+    if check_mode:
+        for e in errors:
+            print(e)
+        if errors:
+            print("Run: python scripts/sync_shared_modules.py")
+            return 1
+        print("OK: shared script modules are up to date")
+        return 0
+
+    print(f"Synced {synced} shared module copies")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,15 +13,13 @@ Requires:
 """
 
 import sys
-from together import Together
-
-client = Together()
+from _together_client import get_client
 
 
 def transcribe(audio_path: str, language: str = "en"):
     """Basic transcription."""
     with open(audio_path, "rb") as f:
-        response = client.audio.transcriptions.create(
+        response = get_client().audio.transcriptions.create(
             file=f,
             model="openai/whisper-large-v3",
             language=language,
@@ -33,7 +31,7 @@ def transcribe(audio_path: str, language: str = "en"):
 def transcribe_with_timestamps(audio_path: str):
     """Transcription with word-level timestamps."""
     with open(audio_path, "rb") as f:
-        response = client.audio.transcriptions.create(
+        response = get_client().audio.transcriptions.create(
             file=f,
             model="openai/whisper-large-v3",
             response_format="verbose_json",
@@ -47,7 +45,7 @@ def transcribe_with_timestamps(audio_path: str):
 def transcribe_with_diarization(audio_path: str, min_speakers: int = 1, max_speakers: int = 5):
     """Transcription with speaker identification."""
     with open(audio_path, "rb") as f:
-        response = client.audio.transcriptions.create(
+        response = get_client().audio.transcriptions.create(
             file=f,
             model="openai/whisper-large-v3",
             response_format="verbose_json",
@@ -63,7 +61,7 @@ def transcribe_with_diarization(audio_path: str, min_speakers: int = 1, max_spea
 def translate_to_english(audio_path: str):
     """Translate foreign-language audio to English text."""
     with open(audio_path, "rb") as f:
-        response = client.audio.translations.create(
+        response = get_client().audio.translations.create(
             file=f,
             model="openai/whisper-large-v3",
         )
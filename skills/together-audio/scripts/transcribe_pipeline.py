@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Together AI Long-Audio Transcription Pipeline (v2 SDK)
+
+Split long recordings at silence boundaries with ffmpeg, transcribe the
+chunks concurrently, and stitch the results back into one transcript
+with absolute word/segment timestamps and continuous speaker IDs. A
+whole directory can be processed with one bounded worker pool; files
+whose transcript already exists are skipped, so an interrupted run
+resumes where it stopped.
+
+Each chunk after the first starts `overlap` seconds early. Items from
+that overlap are dropped when stitching (the previous chunk owns them)
+but are used to map the chunk's local speaker labels onto the speakers
+already seen, by how much their words overlap in time.
+
+Usage:
+    python transcribe_pipeline.py recording.mp3 [--diarize]
+    python transcribe_pipeline.py recordings/ --out transcripts/ [--diarize] [--workers 16]
+
+Requires:
+    pip install together
+    ffmpeg and ffprobe on PATH
+    export TOGETHER_API_KEY=your_key
+"""
+
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from _together_client import get_client
+
+MODEL = "openai/whisper-large-v3"
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".m4a", ".webm", ".flac")
+
+
+# --- 1. Find silence and plan chunks ---
+def probe_duration(path: str) -> float:
+    """Audio duration in seconds (ffprobe)."""
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", path],
+        capture_output=True, text=True, check=True,
+    )
+    return float(result.stdout.strip())
+
+
+def detect_silences(path: str, noise_db: int = -35, min_silence: float = 0.5) -> list[tuple[float, float]]:
+    """(start, end) of every silence of at least `min_silence` seconds (ffmpeg silencedetect)."""
+    result = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-nostats", "-i", path,
+         "-af", f"silencedetect=noise={noise_db}dB:d={min_silence}", "-f", "null", "-"],
+        capture_output=True, text=True, check=True,
+    )
+    starts = [float(s) for s in re.findall(r"silence_start: (-?[\d.]+)", result.stderr)]
+    ends = [float(e) for e in re.findall(r"silence_end: ([\d.]+)", result.stderr)]
+    return list(zip(starts, ends))
+
+
+def plan_chunks(
+    duration: float,
+    silences: list[tuple[float, float]],
+    target_seconds: float = 600,
+    max_seconds: float = 900,
+) -> list[float]:
+    """Chunk boundaries (0 ... duration) cut at the middle of a silence.
+
+    Each cut is the silence nearest `target_seconds` after the previous
+    cut, no later than `max_seconds`; with no silence in range the cut
+    is forced at `max_seconds`.
+    """
+    cuts = [(start + end) / 2 for start, end in silences]
+    boundaries = [0.0]
+    while duration - boundaries[-1] > max_seconds:
+        last = boundaries[-1]
+        candidates = [c for c in cuts if last + target_seconds / 2 <= c <= last + max_seconds]
+        target = last + target_seconds
+        boundaries.append(min(candidates, key=lambda c: abs(c - target)) if candidates else last + max_seconds)
+    boundaries.append(duration)
+    return boundaries
+
+
+def extract_chunk(path: str, start: float, end: float, out_path: str) -> str:
+    """Cut [start, end) to 16 kHz mono FLAC, the rate Whisper resamples to anyway."""
+    subprocess.run(
+        ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-ss", f"{start:.3f}", "-to", f"{end:.3f}",
+         "-i", path, "-ac", "1", "-ar", "16000", "-c:a", "flac", out_path],
+        check=True,
+    )
+    return out_path
+
+
+# --- 2. Transcribe one chunk ---
+def transcribe_chunk(chunk_path: str, diarize: bool = False, language: str | None = None) -> dict:
+    """Verbose transcription of one chunk, with word timestamps (and speakers if `diarize`)."""
+    options = {"diarize": "true"} if diarize else {"timestamp_granularities": "word"}
+    if language:
+        options["language"] = language
+    with open(chunk_path, "rb") as f:
+        response = get_client().audio.transcriptions.create(
+            file=f,
+            model=MODEL,
+            response_format="verbose_json",
+            **options,
+        )
+    return response.model_dump(exclude_none=True)
+
+
+# --- 3. Stitch chunks ---
+def _shift(item: dict, offset: float) -> dict:
+    item = dict(item, start=item["start"] + offset, end=item["end"] + offset)
+    if "words" in item:
+        item["words"] = [_shift(w, offset) for w in item["words"]]
+    return item
+
+
+def _owned(item: dict, boundary: float) -> bool:
+    """Whether an item belongs to the chunk starting at `boundary` rather than the previous one."""
+    return (item["start"] + item["end"]) / 2 >= boundary
+
+
+def _speaker_words(speaker_segments: list[dict]) -> list[dict]:
+    return [w for seg in speaker_segments for w in seg.get("words", []) if "speaker_id" in w]
+
+
+def map_speakers(overlap_words: list[dict], previous_words: list[dict]) -> dict[str, str]:
+    """Map a chunk's local speaker labels to global IDs using words in the shared overlap.
+
+    Pairs are matched greedily by total time the two speakers' words
+    overlap; local speakers left unmatched get new global IDs.
+    """
+    overlap: dict[tuple[str, str], float] = {}
+    for w in overlap_words:
+        for p in previous_words:
+            shared = min(w["end"], p["end"]) - max(w["start"], p["start"])
+            if shared > 0:
+                pair = (w["speaker_id"], p["speaker_id"])
+                overlap[pair] = overlap.get(pair, 0.0) + shared
+
+    mapping: dict[str, str] = {}
+    for (local, global_id), _ in sorted(overlap.items(), key=lambda kv: -kv[1]):
+        if local not in mapping and global_id not in mapping.values():
+            mapping[local] = global_id
+    return mapping
+
+
+def stitch(boundaries: list[float], starts: list[float], results: list[dict]) -> dict:
+    """Merge per-chunk results into one transcript on the original timeline.
+
+    Chunk i covers audio from `starts[i]` (boundary minus overlap) to
+    `boundaries[i + 1]` and owns the items between `boundaries[i]` and
+    `boundaries[i + 1]`.
+    """
+    segments, words, speaker_segments, texts = [], [], [], []
+    known: set[str] = set()
+
+    for i, (start, result) in enumerate(zip(starts, results)):
+        boundary = boundaries[i]
+        chunk_segments = [_shift(s, start) for s in result.get("segments", [])]
+        chunk_words = [_shift(w, start) for w in result.get("words", [])]
+        chunk_speakers = [_shift(s, start) for s in result.get("speaker_segments", [])]
+
+        if chunk_speakers:
+            spoken = _speaker_words(chunk_speakers)
+            in_overlap = [w for w in spoken if not _owned(w, boundary)]
+            previous = [w for w in _speaker_words(speaker_segments) if w["end"] > start]
+            mapping = map_speakers(in_overlap, previous)
+            for local in sorted({w["speaker_id"] for w in spoken} | {s["speaker_id"] for s in chunk_speakers}):
+                if local not in mapping:
+                    mapping[local] = f"SPEAKER_{len(known):02d}"
+                known.add(mapping[local])
+            for seg in chunk_speakers:
+                seg["speaker_id"] = mapping[seg["speaker_id"]]
+                seg["words"] = [dict(w, speaker_id=mapping[w["speaker_id"]]) if "speaker_id" in w else w
+                                for w in seg.get("words", []) if _owned(w, boundary)]
+
+        segments += [s for s in chunk_segments if _owned(s, boundary)]
+        words += [w for w in chunk_words if _owned(w, boundary)]
+        speaker_segments += [s for s in chunk_speakers if _owned(s, boundary)]
+        if not chunk_segments and not chunk_words and not chunk_speakers:
+            texts.append(result.get("text", "").strip())
+
+    if segments or speaker_segments:
+        texts = [s["text"].strip() for s in (segments or speaker_segments)]
+    elif words:
+        texts = [w["word"].strip() for w in words]
+    stitched = {
+        "text": " ".join(t for t in texts if t),
+        "duration": boundaries[-1],
+        "language": next((r["language"] for r in results if r.get("language")), None),
+        "segments": segments,
+        "words": words,
+        "chunks": [{"start": s, "end": e} for s, e in zip(boundaries, boundaries[1:])],
+    }
+    if speaker_segments:
+        stitched["speaker_segments"] = speaker_segments
+        stitched["speakers"] = sorted(known)
+    return stitched
+
+
+# --- 4. Whole files and directories ---
+def transcribe_long(
+    path: str,
+    pool: ThreadPoolExecutor,
+    diarize: bool = False,
+    language: str | None = None,
+    target_seconds: float = 600,
+    max_seconds: float = 900,
+    overlap: float = 5.0,
+) -> dict:
+    """Split `path` at silences, transcribe its chunks on `pool`, and stitch the results."""
+    duration = probe_duration(path)
+    boundaries = plan_chunks(duration, detect_silences(path), target_seconds, max_seconds)
+    starts = [0.0] + [max(0.0, b - overlap) for b in boundaries[1:-1]]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        futures = []
+        for i, (start, end) in enumerate(zip(starts, boundaries[1:])):
+            chunk = extract_chunk(path, start, end, os.path.join(tmp, f"chunk_{i:05d}.flac"))
+            futures.append(pool.submit(transcribe_chunk, chunk, diarize, language))
+        results = [f.result() for f in futures]
+    return stitch(boundaries, starts, results)
+
+
+def _save(transcript: dict, out_path: str):
+    tmp = f"{out_path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(transcript, f, ensure_ascii=False)
+    os.replace(tmp, out_path)
+
+
+def transcribe_directory(
+    directory: str,
+    out_dir: str,
+    max_workers: int = 8,
+    max_files: int = 4,
+    **options,
+) -> dict[str, str]:
+    """Transcribe every audio file in `directory` into `out_dir/<name>.json`.
+
+    At most `max_workers` chunk requests are in flight across all files,
+    and at most `max_files` files are split at a time. Returns
+    {audio path: transcript path or error message}.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    todo = {}
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(AUDIO_EXTENSIONS):
+            out_path = os.path.join(out_dir, os.path.splitext(name)[0] + ".json")
+            if not os.path.exists(out_path):
+                todo[os.path.join(directory, name)] = out_path
+    print(f"Transcribing {len(todo)} file(s) from {directory}")
+
+    def run(path: str) -> str:
+        try:
+            _save(transcribe_long(path, chunk_pool, **options), todo[path])
+            print(f"  done  {path}")
+            return todo[path]
+        except Exception as e:  # one bad file must not stop the rest
+            print(f"  FAIL  {path}: {e}")
+            return f"error: {e}"
+
+    with ThreadPoolExecutor(max_workers) as chunk_pool, ThreadPoolExecutor(max_files) as file_pool:
+        return dict(zip(todo, file_pool.map(run, todo)))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python transcribe_pipeline.py <audio_file_or_dir> [--out DIR] [--diarize] [--workers N]")
+        sys.exit(1)
+
+    target = sys.argv[1]
+    flags = sys.argv[2:]
+    diarize = "--diarize" in flags
+    workers = int(flags[flags.index("--workers") + 1]) if "--workers" in flags else 8
+
+    if os.path.isdir(target):
+        out_dir = flags[flags.index("--out") + 1] if "--out" in flags else "transcripts"
+        transcribe_directory(target, out_dir, max_workers=workers, diarize=diarize)
+    else:
+        with ThreadPoolExecutor(workers) as pool:
+            transcript = transcribe_long(target, pool, diarize=diarize)
+        out_path = os.path.splitext(target)[0] + ".json"
+        _save(transcript, out_path)
+        print(f"{len(transcript['chunks'])} chunk(s), {transcript['duration']:.0f}s -> {out_path}")
+        print(transcript["text"][:500])
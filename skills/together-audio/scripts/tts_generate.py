@@ -13,18 +13,14 @@ Requires:
 """
 
 import asyncio
-import base64
-import json
-import os
 
-from together import Together
-
-client = Together()
+from _together_client import get_client
+from tts_stream import StreamStats, WavSink, pcm_frames, stream_to_sink, websocket_speech
 
 
 def tts_rest(text: str, output_file: str = "speech.mp3"):
     """Generate speech and save to file (REST API)."""
-    response = client.audio.speech.create(
+    response = get_client().audio.speech.create(
         model="canopylabs/orpheus-3b-0.1-ft",
         input=text,
         voice="tara",
@@ -36,7 +32,7 @@ def tts_rest(text: str, output_file: str = "speech.mp3"):
 
 def tts_streaming(text: str, output_file: str = "speech_stream.wav"):
     """Generate speech with streaming for low time-to-first-byte."""
-    response = client.audio.speech.create(
+    response = get_client().audio.speech.create(
         model="canopylabs/orpheus-3b-0.1-ft",
         input=text,
         voice="tara",
@@ -44,45 +40,21 @@ def tts_streaming(text: str, output_file: str = "speech_stream.wav"):
         response_format="raw",
         response_encoding="pcm_s16le",
     )
-    response.stream_to_file(output_file, response_format="wav")
+    # Decode chunks into PCM frames as they arrive; see tts_stream.py for sinks and stats.
+    sink = WavSink(output_file)
+    try:
+        for frame in pcm_frames(chunk.b64 for chunk in response):
+            sink.write(frame)
+    finally:
+        sink.close()
     print(f"Saved to {output_file}")
 
 
 async def tts_websocket(text_chunks: list[str], output_file: str = "speech_ws.wav"):
     """Generate speech via WebSocket for real-time interactive use."""
-    import websockets
-
-    api_key = os.environ["TOGETHER_API_KEY"]
-    url = "wss://api.together.ai/v1/audio/speech/websocket?model=hexgrad/Kokoro-82M&voice=af_alloy"
-    headers = {"Authorization": f"Bearer {api_key}"}
-
-    async with websockets.connect(url, additional_headers=headers) as ws:
-        # Wait for session creation
-        session_msg = await ws.recv()
-        session = json.loads(session_msg)
-        print(f"Session: {session['session']['id']}")
-
-        audio_data = bytearray()
-
-        async def send():
-            for chunk in text_chunks:
-                await ws.send(json.dumps({"type": "input_text_buffer.append", "text": chunk}))
-                await asyncio.sleep(0.3)
-            await ws.send(json.dumps({"type": "input_text_buffer.commit"}))
-
-        async def receive():
-            async for message in ws:
-                data = json.loads(message)
-                if data["type"] == "conversation.item.audio_output.delta":
-                    audio_data.extend(base64.b64decode(data["delta"]))
-                elif data["type"] == "conversation.item.audio_output.done":
-                    break
-
-        await asyncio.gather(send(), receive())
-
-        with open(output_file, "wb") as f:
-            f.write(audio_data)
-        print(f"Saved to {output_file}")
+    stats = StreamStats(frame_seconds=0.020)
+    await stream_to_sink(websocket_speech(text_chunks, stats=stats), WavSink(output_file))
+    print(f"Saved to {output_file}  ({stats.summary()})")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Together AI TTS WebSocket Session Pool (v2 SDK)
+
+Keep authenticated TTS WebSocket sessions warm, keyed by (model, voice),
+so short utterances skip the connect + session handshake. Requests are
+dispatched to whichever session for their voice is free, opening new
+ones up to `max_sessions` per voice and queueing beyond that. Each
+session speaks one utterance at a time. A background task pings idle
+sessions, drops ones that fail, and closes ones idle longer than
+`idle_timeout`.
+
+Usage:
+    python tts_session_pool.py
+
+Requires:
+    pip install together websockets
+    export TOGETHER_API_KEY=your_key
+"""
+
+import asyncio
+import time
+from typing import AsyncIterable, AsyncIterator, Iterable
+from urllib.parse import urlencode
+
+from tts_stream import StreamStats, WavSink, open_session, speak_on, stream_to_sink
+
+WS_BASE_URL = "wss://api.together.ai/v1/audio/speech/websocket"
+DEFAULT_MODEL = "hexgrad/Kokoro-82M"
+DEFAULT_VOICE = "af_alloy"
+
+
+class _Session:
+    def __init__(self, ws, session_id: str, key: tuple[str, str]):
+        self.ws = ws
+        self.id = session_id
+        self.key = key
+        self.last_used = time.monotonic()
+
+    @property
+    def open(self) -> bool:
+        return self.ws.close_code is None
+
+
+class TTSSessionPool:
+    """Warm TTS WebSocket sessions per (model, voice) with health checks and idle eviction."""
+
+    def __init__(
+        self,
+        max_sessions: int = 4,
+        idle_timeout: float = 60.0,
+        health_interval: float = 15.0,
+        ping_timeout: float = 5.0,
+        base_url: str = WS_BASE_URL,
+    ):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.health_interval = health_interval
+        self.ping_timeout = ping_timeout
+        self.base_url = base_url
+        self._idle: dict[tuple[str, str], list[_Session]] = {}
+        self._slots: dict[tuple[str, str], asyncio.Semaphore] = {}
+        self._maintainer: asyncio.Task | None = None
+        self.counters = {"opened": 0, "reused": 0, "evicted_idle": 0, "failed_health": 0, "discarded": 0}
+
+    async def __aenter__(self) -> "TTSSessionPool":
+        self._maintainer = asyncio.create_task(self._maintain())
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def _url(self, key: tuple[str, str]) -> str:
+        model, voice = key
+        return f"{self.base_url}?{urlencode({'model': model, 'voice': voice})}"
+
+    async def warm(self, model: str = DEFAULT_MODEL, voice: str = DEFAULT_VOICE, count: int = 1):
+        """Open up to `count` idle sessions ahead of traffic, within `max_sessions` for the voice."""
+        key = (model, voice)
+        idle = self._idle.setdefault(key, [])
+        slots = self._slots.setdefault(key, asyncio.Semaphore(self.max_sessions))
+        in_use = self.max_sessions - slots._value
+        missing = max(0, min(count, self.max_sessions) - len(idle) - in_use)
+        # Hold a slot per session being opened so concurrent `acquire`s can't overshoot the cap.
+        for _ in range(missing):
+            await slots.acquire()
+        try:
+            opened = await asyncio.gather(*(open_session(self._url(key)) for _ in range(missing)))
+            self.counters["opened"] += len(opened)
+            idle.extend(_Session(ws, session_id, key) for ws, session_id in opened)
+        finally:
+            for _ in range(missing):
+                slots.release()
+
+    async def acquire(self, model: str = DEFAULT_MODEL, voice: str = DEFAULT_VOICE) -> _Session:
+        """Check out a free session for (model, voice), waiting if all `max_sessions` are busy."""
+        key = (model, voice)
+        slots = self._slots.setdefault(key, asyncio.Semaphore(self.max_sessions))
+        await slots.acquire()
+        idle = self._idle.setdefault(key, [])
+        while idle:
+            session = idle.pop()  # most recently used: least likely to have gone stale
+            if session.open:
+                self.counters["reused"] += 1
+                return session
+            self.counters["discarded"] += 1
+        try:
+            ws, session_id = await open_session(self._url(key))
+        except BaseException:
+            slots.release()
+            raise
+        self.counters["opened"] += 1
+        return _Session(ws, session_id, key)
+
+    async def release(self, session: _Session, reusable: bool = True):
+        """Return a session to the pool; sessions that broke or were abandoned mid-utterance are closed."""
+        try:
+            if reusable and session.open:
+                session.last_used = time.monotonic()
+                self._idle.setdefault(session.key, []).append(session)
+            else:
+                self.counters["discarded"] += 1
+                await self._close(session)
+        finally:
+            self._slots[session.key].release()
+
+    async def speak(
+        self,
+        text: Iterable[str] | AsyncIterable[str],
+        model: str = DEFAULT_MODEL,
+        voice: str = DEFAULT_VOICE,
+        frame_ms: int = 20,
+        stats: StreamStats | None = None,
+        max_pending: int = 2,
+    ) -> AsyncIterator[memoryview]:
+        """PCM frames for `text` on a pooled session (see `tts_stream.speak_on`).
+
+        The session goes back to the pool only if the utterance finished;
+        after an error or an abandoned stream it is closed, and its slot
+        is freed either way.
+        """
+        session = await self.acquire(model, voice)
+        finished = False
+        try:
+            async for frame in speak_on(session.ws, text, frame_ms, stats, max_pending):
+                yield frame
+            finished = True
+        finally:
+            await self.release(session, reusable=finished)
+
+    async def _check(self, session: _Session) -> bool:
+        try:
+            pong = await session.ws.ping()
+            await asyncio.wait_for(pong, self.ping_timeout)
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    async def _close(session: _Session):
+        try:
+            await session.ws.close()
+        except Exception:
+            pass  # already broken; nothing left to release
+
+    async def _maintain_once(self):
+        now = time.monotonic()
+        # Snapshot: `acquire`/`warm`/`release` may add keys while this pass awaits.
+        for idle in list(self._idle.values()):
+            # Take the sessions out while checking so `acquire` can't hand one out mid-ping.
+            candidates, idle[:] = idle[:], []
+            keep = []
+            for session in candidates:
+                if now - session.last_used > self.idle_timeout:
+                    self.counters["evicted_idle"] += 1
+                    await self._close(session)
+                elif await self._check(session):
+                    keep.append(session)
+                else:
+                    self.counters["failed_health"] += 1
+                    await self._close(session)
+            idle.extend(keep)
+
+    async def _maintain(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            try:
+                await self._maintain_once()
+            except Exception as e:  # keep maintaining; one bad pass must not stop eviction for good
+                print(f"TTS session pool maintenance failed: {e!r}")
+
+    async def close(self):
+        if self._maintainer:
+            self._maintainer.cancel()
+        for idle in list(self._idle.values()):
+            sessions, idle[:] = idle[:], []
+            for session in sessions:
+                await self._close(session)
+
+    def stats(self) -> dict:
+        return dict(self.counters, idle=sum(len(idle) for idle in self._idle.values()))
+
+
+async def main():
+    lines = ["Hello!", "Your order has shipped.", "Anything else?", "Goodbye."]
+    async with TTSSessionPool(max_sessions=2) as pool:
+        await pool.warm(count=2)
+        started = time.perf_counter()
+
+        async def say(i: int, line: str):
+            stats = StreamStats(frame_seconds=0.020)
+            await stream_to_sink(pool.speak([line], stats=stats), WavSink(f"line_{i}.wav"))
+            print(f"  line_{i}.wav  first audio {stats.summary().get('time_to_first_audio_ms')} ms")
+
+        await asyncio.gather(*(say(i, line) for i, line in enumerate(lines)))
+        print(f"{len(lines)} utterances in {time.perf_counter() - started:.2f}s; pool: {pool.stats()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,491 @@
+#!/usr/bin/env python3
+"""
+Together AI Streaming TTS — PCM Frames to a Pluggable Sink (v2 SDK)
+
+Stream speech as fixed-size PCM frames while it is still being
+generated, instead of buffering the whole clip. Base64 deltas (REST
+stream or WebSocket) are decoded into a preallocated ring buffer and
+handed out as memoryviews of whole frames, ready for a sink: a WAV
+file, a pipe to a player process, or a socket. `StreamStats` reports
+time-to-first-audio, steady-state jitter, and underruns against the
+real-time playback schedule.
+
+`speak_reply` pipelines a streaming chat completion into the WebSocket:
+LLM deltas are regrouped into sentences/phrases, each appended and
+committed as soon as it is complete, with the number of commits still
+awaiting audio bounded so a slow consumer throttles the sender.
+
+Usage:
+    python tts_stream.py                      # REST stream -> speech_stream.wav
+    python tts_stream.py --ws                 # WebSocket  -> speech_stream.wav
+    python tts_stream.py --chat "Tell me a short story."   # LLM reply -> WebSocket TTS
+    python tts_stream.py --pipe "ffplay -nodisp -autoexit -f s16le -ar 24000 -ch_layout mono -"
+
+Requires:
+    pip install together websockets
+    export TOGETHER_API_KEY=your_key
+"""
+
+import asyncio
+import binascii
+import inspect
+import json
+import os
+import re
+import shlex
+import statistics
+import subprocess
+import sys
+import time
+import wave
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator
+
+from _together_client import get_async_client
+
+SAMPLE_RATE = 24_000
+SAMPLE_WIDTH = 2  # pcm_s16le, mono
+REST_MODEL = "canopylabs/orpheus-3b-0.1-ft"
+WS_URL = "wss://api.together.ai/v1/audio/speech/websocket?model=hexgrad/Kokoro-82M&voice=af_alloy"
+CHAT_MODEL = "meta-llama/Llama-3.3-70B-Instruct-Turbo"
+
+SENTENCE_END = re.compile(r"[.!?…]+[\"'”’)\]]*\s+")
+CLAUSE_END = re.compile(r"[,;:—]\s+")
+
+
+def frame_bytes(frame_ms: int = 20, sample_rate: int = SAMPLE_RATE) -> int:
+    return sample_rate * SAMPLE_WIDTH * frame_ms // 1000
+
+
+# --- 1. Ring buffer and frame generators ---
+class PcmRingBuffer:
+    """Preallocated ring of PCM bytes, read out as whole frames.
+
+    The capacity is a multiple of the frame size and reads always take
+    whole frames, so every frame is a single contiguous memoryview into
+    the ring — no per-frame copy. A frame is only valid until the next
+    `write`; sinks that keep data must copy it.
+    """
+
+    def __init__(self, frame_size: int, capacity_frames: int = 256):
+        self.frame_size = frame_size
+        self.capacity = frame_size * capacity_frames
+        self._view = memoryview(bytearray(self.capacity))
+        self._read = 0
+        self._size = 0
+
+    def write(self, data: memoryview) -> int:
+        """Copy as much of `data` as fits; return the number of bytes taken."""
+        n = min(len(data), self.capacity - self._size)
+        start = (self._read + self._size) % self.capacity
+        first = min(n, self.capacity - start)
+        self._view[start:start + first] = data[:first]
+        self._view[:n - first] = data[first:n]
+        self._size += n
+        return n
+
+    def frames(self) -> Iterator[memoryview]:
+        while self._size >= self.frame_size:
+            frame = self._view[self._read:self._read + self.frame_size]
+            self._read = (self._read + self.frame_size) % self.capacity
+            self._size -= self.frame_size
+            yield frame
+
+    def flush(self) -> Iterator[memoryview]:
+        """Whole frames, then the final partial frame if any."""
+        yield from self.frames()
+        if self._size:
+            tail = self._view[self._read:self._read + self._size]
+            self._size = 0
+            yield tail
+
+
+class StreamStats:
+    """Time-to-first-audio, jitter, and underruns of a frame stream.
+
+    Jitter is the spread of the gaps between audio chunk arrivals after
+    `warmup` chunks. For underruns, playback is assumed to start when the
+    first frame arrives, so frame k is due at first + k * frame duration;
+    a frame arriving after that is late, and the worst lateness is the
+    prebuffer needed for glitch-free playback.
+    """
+
+    def __init__(self, frame_seconds: float, warmup: int = 5):
+        self.frame_seconds = frame_seconds
+        self.warmup = warmup
+        self.start()
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.chunks: list[float] = []
+        self.frames: list[float] = []
+
+    def chunk(self, arrived: float):
+        self.chunks.append(arrived)
+
+    def frame(self, arrived: float):
+        self.frames.append(arrived)
+
+    def summary(self) -> dict:
+        if not self.frames:
+            return {"frames": 0}
+        first = self.frames[0]
+        lateness = [t - (first + k * self.frame_seconds) for k, t in enumerate(self.frames)]
+        gaps = [b - a for a, b in zip(self.chunks[self.warmup:], self.chunks[self.warmup + 1:])]
+        audio = len(self.frames) * self.frame_seconds
+        wall = self.frames[-1] - self.started
+        return {
+            "frames": len(self.frames),
+            "time_to_first_audio_ms": round((first - self.started) * 1000, 1),
+            "audio_seconds": round(audio, 2),
+            "realtime_factor": round(audio / wall, 2) if wall > 0 else None,
+            "chunk_gap_ms": round(statistics.mean(gaps) * 1000, 2) if gaps else None,
+            "jitter_ms": round(statistics.pstdev(gaps) * 1000, 2) if len(gaps) > 1 else None,
+            "max_lateness_ms": round(max(0.0, max(lateness)) * 1000, 1),
+            "late_frames": sum(1 for late in lateness if late > 0),
+        }
+
+
+def _decode_into(ring: PcmRingBuffer, chunk: str, stats: StreamStats | None) -> Iterator[memoryview]:
+    arrived = time.perf_counter()
+    if stats:
+        stats.chunk(arrived)
+    data = memoryview(binascii.a2b_base64(chunk))
+    while data:
+        taken = ring.write(data)
+        data = data[taken:]
+        for frame in ring.frames():
+            if stats:
+                stats.frame(arrived)
+            yield frame
+
+
+def pcm_frames(
+    b64_chunks: Iterable[str],
+    frame_ms: int = 20,
+    stats: StreamStats | None = None,
+) -> Iterator[memoryview]:
+    """Yield fixed-size PCM frames from base64 audio chunks as they arrive."""
+    ring = PcmRingBuffer(frame_bytes(frame_ms))
+    for chunk in b64_chunks:
+        yield from _decode_into(ring, chunk, stats)
+    yield from ring.flush()
+
+
+async def apcm_frames(
+    b64_chunks: AsyncIterable[str],
+    frame_ms: int = 20,
+    stats: StreamStats | None = None,
+) -> AsyncIterator[memoryview]:
+    """Async variant of `pcm_frames`."""
+    ring = PcmRingBuffer(frame_bytes(frame_ms))
+    async for chunk in b64_chunks:
+        for frame in _decode_into(ring, chunk, stats):
+            yield frame
+    for frame in ring.flush():
+        yield frame
+
+
+# --- 2. Text sources ---
+async def _aiter(items: Iterable[str] | AsyncIterable[str]) -> AsyncIterator[str]:
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+def prefetch(items: AsyncIterable[str], maxsize: int = 0) -> AsyncIterator[str]:
+    """Start consuming `items` now, in a task, so e.g. an LLM request overlaps the WebSocket handshake."""
+    queue: asyncio.Queue = asyncio.Queue(maxsize)
+    done = object()
+
+    async def pump():
+        try:
+            async for item in items:
+                await queue.put(item)
+        except Exception as e:
+            await queue.put(e)
+        await queue.put(done)
+
+    task = asyncio.create_task(pump())
+
+    async def drain():
+        try:
+            while (item := await queue.get()) is not done:
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            task.cancel()
+
+    return drain()
+
+
+async def chat_text(messages: list[dict], model: str = CHAT_MODEL, **params) -> AsyncIterator[str]:
+    """Content deltas of a streaming chat completion."""
+    stream = await get_async_client().chat.completions.create(
+        model=model,
+        messages=messages,
+        stream=True,
+        **params,
+    )
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+def _phrase_end(text: str, min_chars: int, max_chars: int) -> int | None:
+    """Index just past the first speakable break in `text`, or None to keep waiting."""
+    for match in SENTENCE_END.finditer(text):
+        if match.end() >= min_chars:
+            return match.end()
+    if len(text) >= max_chars // 2:
+        clause = CLAUSE_END.search(text, min_chars)
+        if clause:
+            return clause.end()
+    if len(text) >= max_chars:
+        space = text.rfind(" ", 0, max_chars)
+        return space + 1 if space > 0 else max_chars
+    return None
+
+
+async def phrases(
+    deltas: AsyncIterable[str],
+    min_chars: int = 12,
+    max_chars: int = 160,
+) -> AsyncIterator[str]:
+    """Regroup streamed text into sentences or phrases, each yielded as soon as it is complete.
+
+    Sentences end at . ! ? (plus closing quotes) followed by whitespace;
+    pieces shorter than `min_chars` are joined with the next. Once the
+    buffer reaches half of `max_chars` a clause break (, ; : —) is
+    enough, and at `max_chars` it is cut at the last space.
+    """
+    buffer = ""
+    async for delta in deltas:
+        buffer += delta
+        while (cut := _phrase_end(buffer, min_chars, max_chars)) is not None:
+            yield buffer[:cut]
+            buffer = buffer[cut:]
+    if buffer.strip():
+        yield buffer
+
+
+# --- 3. Audio sources ---
+async def rest_speech(
+    text: str,
+    voice: str = "tara",
+    frame_ms: int = 20,
+    stats: StreamStats | None = None,
+) -> AsyncIterator[memoryview]:
+    """PCM frames from the streaming REST endpoint."""
+    stream = await get_async_client().audio.speech.create(
+        model=REST_MODEL,
+        input=text,
+        voice=voice,
+        stream=True,
+        response_format="raw",
+        response_encoding="pcm_s16le",
+    )
+
+    async def deltas():
+        async for chunk in stream:
+            yield chunk.b64
+
+    async for frame in apcm_frames(deltas(), frame_ms, stats):
+        yield frame
+
+
+async def speak_on(
+    ws,
+    text: Iterable[str] | AsyncIterable[str],
+    frame_ms: int = 20,
+    stats: StreamStats | None = None,
+    max_pending: int = 2,
+) -> AsyncIterator[memoryview]:
+    """PCM frames for `text` spoken on an open TTS WebSocket session.
+
+    Each text piece (e.g. a phrase from `phrases`) is appended and
+    committed as soon as it is available, but at most `max_pending`
+    commits may be waiting for their audio to finish. A slow consumer
+    therefore slows the sender instead of letting text pile up. The
+    session is left open, ready for the next utterance.
+    """
+    slots = asyncio.Semaphore(max_pending)
+    wake = asyncio.Event()  # set while audio is pending or the text is exhausted
+    pending = 0
+    sent_all = False
+
+    async def send():
+        nonlocal pending, sent_all
+        try:
+            async for piece in _aiter(text):
+                await slots.acquire()
+                await ws.send(json.dumps({"type": "input_text_buffer.append", "text": piece}))
+                await ws.send(json.dumps({"type": "input_text_buffer.commit"}))
+                pending += 1
+                wake.set()
+        finally:
+            # Also on failure, so `deltas` never waits on a sender that is gone.
+            sent_all = True
+            wake.set()
+
+    async def deltas():
+        nonlocal pending
+        while True:
+            await wake.wait()
+            if pending == 0:
+                if sent_all:
+                    if sender.done() and not sender.cancelled() and sender.exception():
+                        raise sender.exception()
+                    return
+                wake.clear()
+                continue
+            data = json.loads(await ws.recv())
+            if data["type"] == "conversation.item.audio_output.delta":
+                yield data["delta"]
+            elif data["type"] == "conversation.item.audio_output.done":
+                pending -= 1
+                slots.release()
+
+    sender = asyncio.create_task(send())
+    try:
+        async for frame in apcm_frames(deltas(), frame_ms, stats):
+            yield frame
+        await sender  # surface errors from the text source
+    finally:
+        sender.cancel()
+
+
+async def open_session(url: str = WS_URL):
+    """Connect and authenticate a TTS WebSocket; return (ws, session id)."""
+    import websockets
+
+    headers = {"Authorization": f"Bearer {os.environ['TOGETHER_API_KEY']}"}
+    ws = await websockets.connect(url, additional_headers=headers)
+    session = json.loads(await ws.recv())
+    return ws, session["session"]["id"]
+
+
+async def websocket_speech(
+    text: Iterable[str] | AsyncIterable[str],
+    frame_ms: int = 20,
+    stats: StreamStats | None = None,
+    url: str = WS_URL,
+    max_pending: int = 2,
+) -> AsyncIterator[memoryview]:
+    """PCM frames from a one-off WebSocket session (see `speak_on`; tts_session_pool.py keeps sessions warm)."""
+    ws, session_id = await open_session(url)
+    print(f"Session: {session_id}")
+    try:
+        async for frame in speak_on(ws, text, frame_ms, stats, max_pending):
+            yield frame
+    finally:
+        await ws.close()
+
+
+# --- 4. Sinks ---
+class WavSink:
+    """Write frames to a WAV file; the header is finalized on close."""
+
+    def __init__(self, path: str, sample_rate: int = SAMPLE_RATE):
+        self.path = path
+        self._wav = wave.open(path, "wb")
+        self._wav.setnchannels(1)
+        self._wav.setsampwidth(SAMPLE_WIDTH)
+        self._wav.setframerate(sample_rate)
+
+    def write(self, frame: memoryview):
+        self._wav.writeframesraw(frame)
+
+    def close(self):
+        self._wav.close()
+
+
+class PipeSink:
+    """Feed raw PCM to a player or encoder process's stdin (e.g. ffplay, aplay, sox).
+
+    The pipe is unbuffered so each frame reaches the player as soon as it
+    is written, and writes run in a thread so a full pipe blocks only this
+    sink, not the event loop receiving the audio.
+    """
+
+    def __init__(self, command: list[str]):
+        self._proc = subprocess.Popen(command, stdin=subprocess.PIPE, bufsize=0)
+
+    async def write(self, frame: memoryview):
+        # The frame stays valid until this returns: the ring is only refilled
+        # once `stream_to_sink` asks for the next frame.
+        await asyncio.to_thread(self._proc.stdin.write, frame)
+
+    async def close(self):
+        self._proc.stdin.close()
+        await asyncio.to_thread(self._proc.wait)
+
+
+class SocketSink:
+    """Send raw PCM over an asyncio stream, e.g. from `asyncio.open_connection`."""
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self._writer = writer
+
+    async def write(self, frame: memoryview):
+        # The transport may hold on to what it is given, and the frame is
+        # a view into the ring, so hand it a copy.
+        self._writer.write(bytes(frame))
+        await self._writer.drain()
+
+    async def close(self):
+        self._writer.close()
+        await self._writer.wait_closed()
+
+
+async def stream_to_sink(frames: AsyncIterable[memoryview], sink) -> int:
+    """Pump frames into `sink` (sync or async `write`/`close`); return bytes written."""
+    written = 0
+    try:
+        async for frame in frames:
+            result = sink.write(frame)
+            if inspect.isawaitable(result):
+                await result
+            written += len(frame)
+    finally:
+        result = sink.close()
+        if inspect.isawaitable(result):
+            await result
+    return written
+
+
+async def speak_reply(messages: list[dict], sink, stats: StreamStats | None = None, **chat_params) -> int:
+    """Stream a chat reply straight into WebSocket TTS, phrase by phrase, and into `sink`.
+
+    The chat request starts before the WebSocket handshake so the two
+    overlap; time-to-first-audio in `stats` covers both.
+    """
+    if stats:
+        stats.start()
+    text = prefetch(phrases(chat_text(messages, **chat_params)))
+    return await stream_to_sink(websocket_speech(text, stats=stats), sink)
+
+
+if __name__ == "__main__":
+    text = "Today is a wonderful day to build something people love!"
+    flags = sys.argv[1:]
+    stats = StreamStats(frame_seconds=0.020)
+
+    if "--pipe" in flags:
+        sink = PipeSink(shlex.split(flags[flags.index("--pipe") + 1]))
+    else:
+        sink = WavSink("speech_stream.wav")
+
+    if "--chat" in flags:
+        messages = [{"role": "user", "content": flags[flags.index("--chat") + 1]}]
+        written = asyncio.run(speak_reply(messages, sink, stats))
+    elif "--ws" in flags:
+        frames = websocket_speech(["Hello. ", "This is real-time speech. ", "Pretty cool!"], stats=stats)
+        written = asyncio.run(stream_to_sink(frames, sink))
+    else:
+        written = asyncio.run(stream_to_sink(rest_speech(text, stats=stats), sink))
+    print(f"Streamed {written} bytes of PCM")
+    print(f"Stats: {stats.summary()}")
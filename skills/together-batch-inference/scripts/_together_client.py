@@ -0,0 +1,344 @@
+"""
+Shared Together client factory for skill scripts (v2 SDK)
+
+Builds the sync and async clients lazily on first use, with a connection
+pool sized for concurrent code paths so keep-alive connections are
+reused instead of re-established per request. Tests can plug in a custom
+httpx transport (e.g. httpx.MockTransport) or point `base_url` at a
+local mock server.
+
+Every request passes through a client-side rate limiter shared by the
+sync and async clients: per-model request-per-second and
+tokens-per-minute token buckets plus a cap on in-flight requests. Bucket
+sizes come from `configure(rate_limits=...)` and/or are learned from the
+API's rate-limit response headers; a 429 pauses the model for its
+Retry-After and halves its concurrency cap, which then grows back by
+about one slot per window of successful responses (each success adds
+1/cap).
+
+    from _together_client import get_client, get_async_client
+
+    client = get_client()
+    async_client = get_async_client()  # inside a running event loop
+
+Canonical copy: scripts/shared/_together_client.py. It is copied into
+every skill whose scripts import it by scripts/sync_shared_modules.py
+(run from ./scripts/publish.sh) — edit the canonical copy, not the
+per-skill copies.
+
+Requires:
+    pip install together
+    export TOGETHER_API_KEY=your_key
+"""
+
+import asyncio
+import json
+import threading
+import time
+import weakref
+from collections import defaultdict
+
+import httpx
+from httpx._utils import get_environment_proxies
+from together import AsyncTogether, DefaultAsyncHttpxClient, DefaultHttpxClient, Together
+
+# Pool tuning: enough keep-alive slots for thread-pool / asyncio fan-out,
+# kept warm long enough to span polling intervals.
+POOL_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=100, keepalive_expiry=60.0)
+TIMEOUT = httpx.Timeout(120.0, connect=10.0)
+
+# Per-model limits, keyed by model name ("*" is the fallback). Requests
+# without a model (file uploads, batch management) are keyed by URL path.
+# Omitted buckets are created once the API reports limits in headers.
+RATE_LIMITS: dict[str, dict] = {"*": {"rps": None, "tpm": None, "max_concurrency": 32}}
+
+# Response headers the limiter adapts from: (limit, remaining) per bucket.
+REQUEST_LIMIT_HEADERS = ("x-ratelimit-limit", "x-ratelimit-remaining")
+TOKEN_LIMIT_HEADERS = ("x-tokenlimit-limit", "x-tokenlimit-remaining")
+
+
+class TokenBucket:
+    """Bucket of `capacity` units refilled continuously over `period` seconds.
+
+    `reserve` may drive the balance negative and returns how long the
+    caller must wait, so concurrent callers queue in arrival order
+    instead of polling.
+    """
+
+    def __init__(self, capacity: float, period: float):
+        self.capacity = float(capacity)
+        self.period = period
+        self.balance = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.balance = min(self.capacity, self.balance + (now - self.updated) * self.capacity / self.period)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        self._refill(now)
+        self.balance -= min(amount, self.capacity)
+        return max(0.0, -self.balance * self.period / self.capacity)
+
+    def update(self, limit: float | None, remaining: float | None, now: float):
+        """Adopt the server-reported limit and never assume more headroom than it reports."""
+        self._refill(now)
+        if limit:
+            self.capacity = limit
+        if remaining is not None:
+            self.balance = min(self.balance, remaining)
+
+
+class _ModelLimits:
+    def __init__(self, rps: float | None = None, tpm: float | None = None, max_concurrency: int = 32):
+        self.requests = TokenBucket(rps, 1.0) if rps else None
+        self.tokens = TokenBucket(tpm, 60.0) if tpm else None
+        self.max_concurrency = max_concurrency
+        self.concurrency = float(max_concurrency)
+        self.paused_until = 0.0
+
+
+def _header_float(headers: httpx.Headers, name: str) -> float | None:
+    try:
+        return float(headers[name])
+    except (KeyError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """Per-model request/token buckets and an adaptive concurrency cap (AIMD)."""
+
+    def __init__(self, limits: dict[str, dict] | None = None):
+        self.limits = RATE_LIMITS if limits is None else limits
+        self._models: dict[str, _ModelLimits] = {}
+        self._lock = threading.Lock()
+        self.throttled = 0  # 429 responses seen
+
+    def _get(self, key: str) -> _ModelLimits:
+        state = self._models.get(key)
+        if state is None:
+            state = self._models[key] = _ModelLimits(**self.limits.get(key, self.limits.get("*", {})))
+        return state
+
+    def reserve(self, key: str, tokens: int) -> float:
+        """Take one request (and `tokens` tokens) from the buckets; return the delay before sending."""
+        now = time.monotonic()
+        with self._lock:
+            state = self._get(key)
+            delay = state.paused_until - now
+            if state.requests:
+                delay = max(delay, state.requests.reserve(1, now))
+            if state.tokens and tokens:
+                delay = max(delay, state.tokens.reserve(tokens, now))
+            return max(0.0, delay)
+
+    def concurrency_limit(self, key: str) -> int:
+        with self._lock:
+            return max(1, int(self._get(key).concurrency))
+
+    def observe(self, key: str, response: httpx.Response):
+        """Adapt to the rate-limit headers and status of a response."""
+        now = time.monotonic()
+        headers = response.headers
+        with self._lock:
+            state = self._get(key)
+            for attr, period, (limit_name, remaining_name) in (
+                ("requests", 1.0, REQUEST_LIMIT_HEADERS),
+                ("tokens", 60.0, TOKEN_LIMIT_HEADERS),
+            ):
+                limit, remaining = _header_float(headers, limit_name), _header_float(headers, remaining_name)
+                bucket = getattr(state, attr)
+                if bucket is None and limit:
+                    bucket = TokenBucket(limit, period)
+                    setattr(state, attr, bucket)
+                if bucket is not None and (limit or remaining is not None):
+                    bucket.update(limit, remaining, now)
+
+            if response.status_code == 429:
+                self.throttled += 1
+                retry_after = _header_float(headers, "retry-after") or 1.0
+                state.paused_until = max(state.paused_until, now + retry_after)
+                state.concurrency = max(1.0, state.concurrency / 2)
+            elif response.status_code < 500:
+                # Additive increase: 1/cap per success is about one slot per full window.
+                state.concurrency = min(state.max_concurrency, state.concurrency + 1 / state.concurrency)
+
+
+def _request_cost(request: httpx.Request) -> tuple[str, int]:
+    """Return the limiter key (model, else URL path) and an estimated token count for a request."""
+    if not request.headers.get("content-type", "").startswith("application/json"):
+        return request.url.path, 0
+    try:
+        body = json.loads(request.content)
+    except (httpx.RequestNotRead, ValueError):
+        return request.url.path, 0
+    if not isinstance(body, dict):
+        return request.url.path, 0
+    # ~4 characters per token for the prompt, plus the completion budget.
+    prompt = sum(len(json.dumps(body[field])) for field in ("messages", "input", "prompt") if field in body)
+    return body.get("model") or request.url.path, prompt // 4 + int(body.get("max_tokens") or 0)
+
+
+class RateLimitedTransport(httpx.BaseTransport):
+    """Sync transport that waits on the shared `RateLimiter` before each request."""
+
+    def __init__(self, transport: httpx.BaseTransport, limiter: RateLimiter):
+        self.transport = transport
+        self.limiter = limiter
+        self._in_flight: dict[str, int] = defaultdict(int)
+        self._cond = threading.Condition()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        key, tokens = _request_cost(request)
+        with self._cond:
+            while self._in_flight[key] >= self.limiter.concurrency_limit(key):
+                self._cond.wait()
+            self._in_flight[key] += 1
+        try:
+            delay = self.limiter.reserve(key, tokens)
+            if delay:
+                time.sleep(delay)
+            response = self.transport.handle_request(request)
+            self.limiter.observe(key, response)
+            return response
+        finally:
+            with self._cond:
+                self._in_flight[key] -= 1
+                self._cond.notify_all()
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncRateLimitedTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of `RateLimitedTransport` (one per event loop, like the client)."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, limiter: RateLimiter):
+        self.transport = transport
+        self.limiter = limiter
+        self._in_flight: dict[str, int] = defaultdict(int)
+        self._cond = asyncio.Condition()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        key, tokens = _request_cost(request)
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._in_flight[key] < self.limiter.concurrency_limit(key))
+            self._in_flight[key] += 1
+        try:
+            delay = self.limiter.reserve(key, tokens)
+            if delay:
+                await asyncio.sleep(delay)
+            response = await self.transport.handle_async_request(request)
+            self.limiter.observe(key, response)
+            return response
+        finally:
+            async with self._cond:
+                self._in_flight[key] -= 1
+                self._cond.notify_all()
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+_lock = threading.Lock()
+_client: Together | None = None
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncTogether]" = weakref.WeakKeyDictionary()
+_settings: dict = {
+    "transport": None,
+    "async_transport": None,
+    "limits": POOL_LIMITS,
+    "timeout": TIMEOUT,
+    "client_kwargs": {},
+}
+_limiter = RateLimiter()
+
+
+def configure(
+    transport: httpx.BaseTransport | None = None,
+    async_transport: httpx.AsyncBaseTransport | None = None,
+    limits: httpx.Limits = POOL_LIMITS,
+    timeout: httpx.Timeout = TIMEOUT,
+    rate_limits: dict[str, dict] | None = None,
+    **client_kwargs,
+):
+    """Override transports, pool limits, timeouts, rate limits, or client arguments (api_key, base_url, max_retries).
+
+    `rate_limits` maps model names (or "*") to {"rps", "tpm",
+    "max_concurrency"}; see `RATE_LIMITS`. Clients built before this call
+    are discarded; the next `get_client()` or `get_async_client()` builds
+    fresh ones with the new settings.
+    """
+    global _client, _limiter
+    with _lock:
+        _settings.update(
+            transport=transport,
+            async_transport=async_transport,
+            limits=limits,
+            timeout=timeout,
+            client_kwargs=client_kwargs,
+        )
+        _limiter = RateLimiter(rate_limits)
+        _client = None
+        _async_clients.clear()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Return the limiter shared by the sync and async clients."""
+    return _limiter
+
+
+def _proxy_mounts(make_transport) -> dict:
+    """Transports for HTTP(S)_PROXY / ALL_PROXY, with NO_PROXY hosts mapped to the default.
+
+    httpx ignores proxy environment variables once a transport is passed,
+    so the rate-limited clients mount them explicitly.
+    """
+    return {
+        pattern: make_transport(proxy) if proxy else None
+        for pattern, proxy in get_environment_proxies().items()
+    }
+
+
+def get_client() -> Together:
+    """Return the process-wide sync client, building it on first use."""
+    global _client
+    with _lock:
+        if _client is None:
+            mounts = {}
+            if _settings["transport"]:
+                transport = RateLimitedTransport(_settings["transport"], _limiter)
+            else:
+                def make_transport(proxy=None):
+                    inner = httpx.HTTPTransport(limits=_settings["limits"], proxy=proxy)
+                    return RateLimitedTransport(inner, _limiter)
+
+                transport = make_transport()
+                mounts = _proxy_mounts(make_transport)
+            http_client = DefaultHttpxClient(timeout=_settings["timeout"], transport=transport, mounts=mounts)
+            _client = Together(http_client=http_client, **_settings["client_kwargs"])
+        return _client
+
+
+def get_async_client() -> AsyncTogether:
+    """Return the async client for the running event loop, building it on first use.
+
+    httpx async pools are bound to the loop that created them, so each
+    event loop (e.g. each `asyncio.run`) gets its own client.
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            mounts = {}
+            if _settings["async_transport"]:
+                transport = AsyncRateLimitedTransport(_settings["async_transport"], _limiter)
+            else:
+                def make_transport(proxy=None):
+                    inner = httpx.AsyncHTTPTransport(limits=_settings["limits"], proxy=proxy)
+                    return AsyncRateLimitedTransport(inner, _limiter)
+
+                transport = make_transport()
+                mounts = _proxy_mounts(make_transport)
+            http_client = DefaultAsyncHttpxClient(timeout=_settings["timeout"], transport=transport, mounts=mounts)
+            client = _async_clients[loop] = AsyncTogether(http_client=http_client, **_settings["client_kwargs"])
+        return client
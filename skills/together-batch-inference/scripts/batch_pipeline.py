@@ -0,0 +1,779 @@
+#!/usr/bin/env python3
+"""
+Together AI Batch Inference — Large-Scale Pipeline (v2 SDK)
+
+Stream requests from any iterable into size- and line-limited JSONL
+shards, upload shards concurrently, and keep a manifest that maps every
+custom_id to its shard. Then track all shard batches at once with
+adaptive polling, stream each finished output straight into a Parquet
+table joined to the manifest, and queue failed rows for retry. Suited
+to multi-million-row jobs that do not fit in a single batch file or in
+memory.
+
+`run_pipeline` checkpoints every stage in SQLite, so rerunning the same
+job after a crash skips finished work and resumes partial downloads.
+`run_with_retries` resubmits retryable failures as follow-up batches and
+merges everything into one Parquet file.
+
+Usage:
+    python batch_pipeline.py   # rerun to resume an interrupted job
+
+Requires:
+    pip install together pyarrow  # pyarrow only for Parquet output
+    export TOGETHER_API_KEY=your_key
+"""
+
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterable, Iterator
+
+from together import APIStatusError
+
+from _together_client import get_async_client, get_client
+
+# Per-batch limits from the Batch API (see references/api-reference.md)
+MAX_REQUESTS_PER_FILE = 50_000
+MAX_FILE_BYTES = 100 * 1024 * 1024
+
+TERMINAL_STATUSES = ("COMPLETED", "FAILED", "EXPIRED", "CANCELLED")
+
+
+def iter_chat_requests(
+    prompts: Iterable[str],
+    model: str = "meta-llama/Meta-Llama-3.1-8B-Instruct-Turbo",
+    max_tokens: int = 128,
+    id_prefix: str = "req",
+) -> Iterator[dict]:
+    """Lazily turn prompts into batch request lines."""
+    for i, prompt in enumerate(prompts):
+        yield {
+            "custom_id": f"{id_prefix}-{i}",
+            "body": {
+                "model": model,
+                "messages": [{"role": "user", "content": prompt}],
+                "max_tokens": max_tokens,
+            },
+        }
+
+
+def iter_shards(
+    requests: Iterable[dict],
+    out_dir: str,
+    max_lines: int = MAX_REQUESTS_PER_FILE,
+    max_bytes: int = MAX_FILE_BYTES,
+    custom_ids: dict[str, int] | None = None,
+) -> Iterator[dict]:
+    """Stream requests into JSONL shard files, yielding each shard as soon as it is closed.
+
+    Only one line is held in memory at a time. If `custom_ids` is given it
+    is filled with custom_id -> shard index; duplicate ids raise ValueError.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    index, f, shard = 0, None, None
+
+    def close():
+        f.close()
+        return shard
+
+    for req in requests:
+        line = (json.dumps(req, separators=(",", ":")) + "\n").encode("utf-8")
+        if len(line) > max_bytes:
+            raise ValueError(f"Request {req.get('custom_id')} is larger than max_bytes ({len(line)} bytes)")
+        if shard and (shard["lines"] >= max_lines or shard["bytes"] + len(line) > max_bytes):
+            yield close()
+            index, shard = index + 1, None
+        if shard is None:
+            path = os.path.join(out_dir, f"shard-{index:05d}.jsonl")
+            f = open(path, "wb")
+            shard = {"index": index, "path": path, "lines": 0, "bytes": 0, "file_id": None}
+        if custom_ids is not None:
+            if req["custom_id"] in custom_ids:
+                f.close()
+                raise ValueError(f"Duplicate custom_id: {req['custom_id']}")
+            custom_ids[req["custom_id"]] = index
+        f.write(line)
+        shard["lines"] += 1
+        shard["bytes"] += len(line)
+
+    if shard:
+        yield close()
+
+
+def upload_shard(shard: dict) -> dict:
+    """Upload one shard file and record its file id on the shard."""
+    file_response = get_client().files.upload(file=shard["path"], purpose="batch-api", check=False)
+    shard["file_id"] = file_response.id
+    print(f"  Uploaded {os.path.basename(shard['path'])} ({shard['lines']} requests) -> {shard['file_id']}")
+    return shard
+
+
+def write_and_upload_shards(
+    requests: Iterable[dict],
+    out_dir: str,
+    max_lines: int = MAX_REQUESTS_PER_FILE,
+    max_bytes: int = MAX_FILE_BYTES,
+    max_workers: int = 4,
+) -> dict:
+    """Shard requests to disk and upload shards concurrently while later shards are still being written.
+
+    Returns a manifest: {"shards": [...], "custom_ids": {custom_id: shard index}}.
+    """
+    manifest = {"shards": [], "custom_ids": {}}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = []
+        for shard in iter_shards(requests, out_dir, max_lines, max_bytes, manifest["custom_ids"]):
+            manifest["shards"].append(shard)
+            futures.append(pool.submit(upload_shard, shard))
+        for future in futures:
+            future.result()
+    return manifest
+
+
+def create_batches(manifest: dict, endpoint: str = "/v1/chat/completions") -> list[str]:
+    """Create one batch per uploaded shard and record its batch id on the shard."""
+    for shard in manifest["shards"]:
+        if shard.get("batch_id"):
+            continue
+        response = get_client().batches.create(input_file_id=shard["file_id"], endpoint=endpoint)
+        shard["batch_id"] = response.job.id
+        print(f"  Created batch {shard['batch_id']} for shard {shard['index']}")
+    return [shard["batch_id"] for shard in manifest["shards"]]
+
+
+def next_poll_delay(
+    delay: float,
+    progress: float,
+    progress_rate: float,
+    min_delay: float = 5.0,
+    max_delay: float = 300.0,
+) -> float:
+    """Pick the next polling interval for one batch.
+
+    While `progress` (0-100) is advancing, aim to poll about twice before
+    the projected finish; when it stalls, back off exponentially. Jitter
+    keeps many in-flight batches from polling in lockstep.
+    """
+    if progress_rate > 0:
+        eta = (100.0 - progress) / progress_rate
+        target = eta / 2
+    else:
+        target = delay * 2
+    target = min(max_delay, max(min_delay, target))
+    return target * random.uniform(0.8, 1.2)
+
+
+async def download_file(file_id: str, path: str, resume: bool = False) -> str:
+    """Stream a file's content to disk.
+
+    With `resume`, an existing partial file is continued with a byte-range
+    request; if the server ignores the range the download restarts.
+    """
+    offset = os.path.getsize(path) if resume and os.path.exists(path) else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else None
+    try:
+        async with get_async_client().files.with_streaming_response.content(
+            id=file_id, extra_headers=headers
+        ) as response:
+            if offset and response.status_code != 206:
+                offset = 0
+            with open(path, "ab" if offset else "wb") as f:
+                async for chunk in response.iter_bytes():
+                    f.write(chunk)
+    except APIStatusError as e:
+        # 416: the partial file already holds every byte.
+        if not (offset and e.status_code == 416):
+            raise
+    return path
+
+
+async def wait_for_batch(
+    batch_id: str,
+    min_delay: float = 5.0,
+    max_delay: float = 300.0,
+):
+    """Poll one batch adaptively until it reaches a terminal status. Returns the final batch."""
+    delay = min_delay
+    last_progress, last_time = 0.0, time.monotonic()
+    polls = 0
+    while True:
+        batch = await get_async_client().batches.retrieve(batch_id)
+        polls += 1
+        if batch.status in TERMINAL_STATUSES:
+            print(f"  {batch_id}: {batch.status} after {polls} polls")
+            return batch
+
+        now = time.monotonic()
+        progress = batch.progress or 0.0
+        rate = (progress - last_progress) / (now - last_time) if now > last_time else 0.0
+        last_progress, last_time = progress, now
+        delay = next_poll_delay(delay, progress, rate, min_delay, max_delay)
+        print(f"  {batch_id}: {batch.status} {progress:.0f}% (next poll in {delay:.0f}s)")
+        await asyncio.sleep(delay)
+
+
+async def track_batch(
+    batch_id: str,
+    out_dir: str,
+    min_delay: float = 5.0,
+    max_delay: float = 300.0,
+) -> dict:
+    """Wait for one batch, then download its output and error files."""
+    batch = await wait_for_batch(batch_id, min_delay, max_delay)
+    result = {"batch_id": batch_id, "status": batch.status,
+              "output_path": None, "error_path": None, "error": batch.error}
+    downloads = []
+    if batch.output_file_id:
+        result["output_path"] = os.path.join(out_dir, f"{batch_id}.output.jsonl")
+        downloads.append(download_file(batch.output_file_id, result["output_path"]))
+    if batch.error_file_id:
+        result["error_path"] = os.path.join(out_dir, f"{batch_id}.errors.jsonl")
+        downloads.append(download_file(batch.error_file_id, result["error_path"]))
+    await asyncio.gather(*downloads)
+    return result
+
+
+async def run_batches(
+    batch_ids: list[str],
+    out_dir: str,
+    min_delay: float = 5.0,
+    max_delay: float = 300.0,
+) -> dict[str, dict]:
+    """Track many batches concurrently; each downloads as soon as it finishes."""
+    os.makedirs(out_dir, exist_ok=True)
+    results = await asyncio.gather(*(
+        track_batch(batch_id, out_dir, min_delay, max_delay) for batch_id in batch_ids
+    ))
+    return {r["batch_id"]: r for r in results}
+
+
+class JSONLDecoder:
+    """Incrementally decode JSONL from arbitrary byte chunks.
+
+    Only the trailing partial line is carried between chunks, so records
+    can be consumed while the file is still downloading.
+    """
+
+    def __init__(self):
+        self._tail = b""
+
+    def feed(self, chunk: bytes) -> list[dict]:
+        lines = (self._tail + chunk).split(b"\n")
+        self._tail = lines.pop()
+        return [json.loads(line) for line in lines if line.strip()]
+
+    def close(self) -> list[dict]:
+        tail, self._tail = self._tail, b""
+        return [json.loads(tail)] if tail.strip() else []
+
+
+async def stream_records(file_id: str):
+    """Yield JSONL records from a file as its bytes arrive, without saving it to disk."""
+    decoder = JSONLDecoder()
+    async with get_async_client().files.with_streaming_response.content(id=file_id) as response:
+        async for chunk in response.iter_bytes():
+            for record in decoder.feed(chunk):
+                yield record
+    for record in decoder.close():
+        yield record
+
+
+RESULT_SCHEMA = {
+    "custom_id": "string",
+    "shard": "int32",
+    "status_code": "int32",
+    "content": "string",
+    "finish_reason": "string",
+    "prompt_tokens": "int32",
+    "completion_tokens": "int32",
+}
+
+
+def parse_result(record: dict) -> dict:
+    """Flatten one output line into a RESULT_SCHEMA row (shard is filled in by the joiner)."""
+    response = record.get("response") or {}
+    body = response.get("body") or {}
+    choice = (body.get("choices") or [{}])[0]
+    usage = body.get("usage") or {}
+    return {
+        "custom_id": record.get("custom_id"),
+        "shard": None,
+        "status_code": response.get("status_code"),
+        "content": (choice.get("message") or {}).get("content"),
+        "finish_reason": choice.get("finish_reason"),
+        "prompt_tokens": usage.get("prompt_tokens"),
+        "completion_tokens": usage.get("completion_tokens"),
+    }
+
+
+MISSING_RESULT = {"code": "missing_result", "message": "No output or error row returned"}
+
+
+def retry_entry(custom_id: str, error, custom_ids: dict[str, int]) -> dict:
+    return {"custom_id": custom_id, "shard": custom_ids.get(custom_id), "error": error}
+
+
+def route_output_record(record: dict, custom_ids: dict[str, int]) -> tuple[dict | None, dict | None]:
+    """Join an output line to the manifest. Returns (row, None) on success or (None, retry entry)."""
+    row = parse_result(record)
+    if row["status_code"] and row["status_code"] >= 400:
+        body = (record.get("response") or {}).get("body") or {}
+        error = body.get("error") if isinstance(body.get("error"), dict) else {"message": str(body.get("error", ""))}
+        return None, retry_entry(row["custom_id"], {"status_code": row["status_code"], **error}, custom_ids)
+    row["shard"] = custom_ids.get(row["custom_id"])
+    return row, None
+
+
+class ParquetResultWriter:
+    """Buffer result rows column-wise and write them to Parquet in row groups."""
+
+    def __init__(self, path: str, row_group_size: int = 50_000):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self.schema = self.arrow_schema()
+        self.row_group_size = row_group_size
+        self.rows = 0
+        self._columns = {name: [] for name in RESULT_SCHEMA}
+        self._writer = pq.ParquetWriter(path, self.schema)
+
+    @staticmethod
+    def arrow_schema():
+        import pyarrow as pa
+
+        return pa.schema([(name, getattr(pa, kind)()) for name, kind in RESULT_SCHEMA.items()])
+
+    def write(self, row: dict):
+        for name, values in self._columns.items():
+            values.append(row.get(name))
+        if len(self._columns["custom_id"]) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if self._columns["custom_id"]:
+            self.rows += len(self._columns["custom_id"])
+            self._writer.write_table(self._pa.table(self._columns, schema=self.schema))
+            self._columns = {name: [] for name in RESULT_SCHEMA}
+
+    def close(self):
+        self.flush()
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+async def collect_results(
+    batch_ids: list[str],
+    manifest: dict,
+    parquet_path: str,
+    min_delay: float = 5.0,
+    max_delay: float = 300.0,
+) -> dict:
+    """Track batches, stream each finished output into one Parquet file, and build a retry queue.
+
+    Rows are joined to the manifest by custom_id. Error-file rows, non-2xx
+    responses, and manifest ids with no result at all go to the retry queue
+    as {"custom_id", "shard", "error"} entries.
+    """
+    custom_ids = manifest["custom_ids"]
+    seen: set[str] = set()
+    retry_queue: list[dict] = []
+    statuses: dict[str, str] = {}
+
+    def queue_retry(custom_id, error):
+        seen.add(custom_id)
+        retry_queue.append(retry_entry(custom_id, error, custom_ids))
+
+    async def collect(batch_id: str):
+        batch = await wait_for_batch(batch_id, min_delay, max_delay)
+        statuses[batch_id] = batch.status
+        if batch.output_file_id:
+            async for record in stream_records(batch.output_file_id):
+                row, retry = route_output_record(record, custom_ids)
+                seen.add(record.get("custom_id"))
+                if retry:
+                    retry_queue.append(retry)
+                else:
+                    writer.write(row)
+        if batch.error_file_id:
+            async for record in stream_records(batch.error_file_id):
+                queue_retry(record.get("custom_id"), record.get("error"))
+
+    with ParquetResultWriter(parquet_path) as writer:
+        await asyncio.gather(*(collect(batch_id) for batch_id in batch_ids))
+
+    tracked_shards = {s["index"] for s in manifest["shards"] if s.get("batch_id") in batch_ids}
+    for custom_id, shard in custom_ids.items():
+        if shard in tracked_shards and custom_id not in seen:
+            queue_retry(custom_id, MISSING_RESULT)
+
+    print(f"Wrote {writer.rows} results to {parquet_path}; {len(retry_queue)} rows queued for retry")
+    return {"rows": writer.rows, "retry_queue": retry_queue, "statuses": statuses}
+
+
+def save_manifest(manifest: dict, path: str):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def load_manifest(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def iter_file_records(path: str, chunk_size: int = 1 << 20) -> Iterator[dict]:
+    """Yield JSONL records from a local file, reading it in fixed-size chunks."""
+    decoder = JSONLDecoder()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            yield from decoder.feed(chunk)
+    yield from decoder.close()
+
+
+class CheckpointStore:
+    """SQLite record of how far each job and shard has progressed.
+
+    Stages, in order: prepared (job), then per shard uploaded, created,
+    polled, downloaded, parsed. Every transition is committed immediately,
+    so a crash loses at most the step in flight.
+    """
+
+    STAGES = ("pending", "prepared", "uploaded", "created", "polled", "downloaded", "parsed")
+    SHARD_FIELDS = ("path", "lines", "bytes", "file_id", "batch_id", "status",
+                    "output_file_id", "error_file_id", "stage")
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY, manifest_path TEXT, stage TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS shards (
+                job_id TEXT, idx INTEGER, path TEXT, lines INTEGER, bytes INTEGER,
+                file_id TEXT, batch_id TEXT, status TEXT, output_file_id TEXT,
+                error_file_id TEXT, stage TEXT NOT NULL,
+                PRIMARY KEY (job_id, idx)
+            );
+        """)
+
+    def job_stage(self, job_id: str) -> str:
+        row = self._db.execute("SELECT stage FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return row[0] if row else "pending"
+
+    def manifest_path(self, job_id: str) -> str | None:
+        row = self._db.execute("SELECT manifest_path FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def mark_prepared(self, job_id: str, manifest: dict, manifest_path: str):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM shards WHERE job_id = ?", (job_id,))
+            self._db.executemany(
+                "INSERT INTO shards (job_id, idx, path, lines, bytes, stage) VALUES (?, ?, ?, ?, ?, 'prepared')",
+                [(job_id, s["index"], s["path"], s["lines"], s["bytes"]) for s in manifest["shards"]],
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, manifest_path, stage) VALUES (?, ?, 'prepared')",
+                (job_id, manifest_path),
+            )
+
+    def shards(self, job_id: str) -> list[dict]:
+        rows = self._db.execute(
+            f"SELECT idx, {', '.join(self.SHARD_FIELDS)} FROM shards WHERE job_id = ? ORDER BY idx",
+            (job_id,),
+        ).fetchall()
+        return [dict(zip(("index",) + self.SHARD_FIELDS, row)) for row in rows]
+
+    def advance(self, job_id: str, shard: dict, stage: str, **fields):
+        """Record that a shard reached `stage`, along with any new fields (file_id, batch_id, ...)."""
+        shard.update(fields, stage=stage)
+        columns = ", ".join(f"{name} = ?" for name in (*fields, "stage"))
+        with self._lock, self._db:
+            self._db.execute(
+                f"UPDATE shards SET {columns} WHERE job_id = ? AND idx = ?",
+                (*fields.values(), stage, job_id, shard["index"]),
+            )
+
+    @classmethod
+    def reached(cls, shard: dict, stage: str) -> bool:
+        return cls.STAGES.index(shard["stage"]) >= cls.STAGES.index(stage)
+
+
+def parse_shard(
+    custom_ids: dict[str, int],
+    shard_ids: list[str],
+    output_path: str | None,
+    error_path: str | None,
+    parquet_path: str,
+    retry_path: str,
+) -> int:
+    """Parse a shard's downloaded files into Parquet plus a retry JSONL. Returns rows written.
+
+    Both outputs are written under temporary names and renamed into place,
+    so a partially parsed shard is never mistaken for a finished one.
+    """
+    seen: set[str] = set()
+    with ParquetResultWriter(parquet_path + ".tmp") as writer, open(retry_path + ".tmp", "w") as retries:
+        if output_path:
+            for record in iter_file_records(output_path):
+                row, retry = route_output_record(record, custom_ids)
+                seen.add(record.get("custom_id"))
+                if retry:
+                    retries.write(json.dumps(retry) + "\n")
+                else:
+                    writer.write(row)
+        if error_path:
+            for record in iter_file_records(error_path):
+                seen.add(record.get("custom_id"))
+                retries.write(json.dumps(retry_entry(record.get("custom_id"), record.get("error"), custom_ids)) + "\n")
+        for custom_id in shard_ids:
+            if custom_id not in seen:
+                retries.write(json.dumps(retry_entry(custom_id, MISSING_RESULT, custom_ids)) + "\n")
+    os.replace(parquet_path + ".tmp", parquet_path)
+    os.replace(retry_path + ".tmp", retry_path)
+    return writer.rows
+
+
+async def run_pipeline(
+    job_id: str,
+    requests: Iterable[dict],
+    work_dir: str,
+    store: CheckpointStore,
+    endpoint: str = "/v1/chat/completions",
+    max_lines: int = MAX_REQUESTS_PER_FILE,
+    max_bytes: int = MAX_FILE_BYTES,
+    max_workers: int = 4,
+    min_delay: float = 5.0,
+    max_delay: float = 300.0,
+) -> dict:
+    """Run (or resume) a checkpointed shard → upload → batch → poll → download → parse job.
+
+    `requests` is only consumed if the job has not been prepared yet. Each
+    shard produces results/shard-NNNNN.parquet and a matching .retry.jsonl.
+    """
+    shard_dir = os.path.join(work_dir, "shards")
+    results_dir = os.path.join(work_dir, "results")
+    os.makedirs(results_dir, exist_ok=True)
+
+    # --- prepared ---
+    if store.job_stage(job_id) == "pending":
+        manifest = {"shards": [], "custom_ids": {}}
+        manifest["shards"] = list(iter_shards(requests, shard_dir, max_lines, max_bytes, manifest["custom_ids"]))
+        manifest_path = os.path.join(work_dir, "manifest.json")
+        save_manifest(manifest, manifest_path)
+        store.mark_prepared(job_id, manifest, manifest_path)
+    manifest = load_manifest(store.manifest_path(job_id))
+    custom_ids = manifest["custom_ids"]
+    shards = store.shards(job_id)
+
+    # --- uploaded ---
+    pending = [s for s in shards if not store.reached(s, "uploaded")]
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(get_client().files.upload, file=s["path"], purpose="batch-api", check=False): s
+                   for s in pending}
+        for future in as_completed(futures):
+            store.advance(job_id, futures[future], "uploaded", file_id=future.result().id)
+
+    # --- created ---
+    for shard in shards:
+        if not store.reached(shard, "created"):
+            response = get_client().batches.create(input_file_id=shard["file_id"], endpoint=endpoint)
+            store.advance(job_id, shard, "created", batch_id=response.job.id)
+
+    ids_by_shard: dict[int, list[str]] = {}
+    for custom_id, index in custom_ids.items():
+        ids_by_shard.setdefault(index, []).append(custom_id)
+
+    async def finish(shard: dict) -> int:
+        # --- polled ---
+        if not store.reached(shard, "polled"):
+            batch = await wait_for_batch(shard["batch_id"], min_delay, max_delay)
+            store.advance(job_id, shard, "polled", status=batch.status,
+                          output_file_id=batch.output_file_id, error_file_id=batch.error_file_id)
+
+        # --- downloaded ---
+        stem = os.path.join(results_dir, f"shard-{shard['index']:05d}")
+        output_path = stem + ".output.jsonl" if shard["output_file_id"] else None
+        error_path = stem + ".errors.jsonl" if shard["error_file_id"] else None
+        if not store.reached(shard, "downloaded"):
+            downloads = []
+            if output_path:
+                downloads.append(download_file(shard["output_file_id"], output_path, resume=True))
+            if error_path:
+                downloads.append(download_file(shard["error_file_id"], error_path, resume=True))
+            await asyncio.gather(*downloads)
+            store.advance(job_id, shard, "downloaded")
+
+        # --- parsed ---
+        if not store.reached(shard, "parsed"):
+            rows = await asyncio.to_thread(
+                parse_shard, custom_ids, ids_by_shard.get(shard["index"], []),
+                output_path, error_path, stem + ".parquet", stem + ".retry.jsonl",
+            )
+            store.advance(job_id, shard, "parsed")
+            print(f"  Shard {shard['index']}: parsed {rows} results")
+        return shard["index"]
+
+    await asyncio.gather(*(finish(shard) for shard in shards))
+
+    retry_queue = []
+    for shard in shards:
+        retry_queue.extend(iter_file_records(os.path.join(results_dir, f"shard-{shard['index']:05d}.retry.jsonl")))
+    return {
+        "shards": len(shards),
+        "results_dir": results_dir,
+        "statuses": {s["batch_id"]: s["status"] for s in shards},
+        "retry_queue": retry_queue,
+    }
+
+
+# Error codes from the error file (or synthesized here) that are worth another attempt.
+RETRYABLE_CODES = {
+    "missing_result", "rate_limit", "rate_limit_exceeded", "timeout", "request_timeout",
+    "server_error", "internal_error", "service_unavailable", "overloaded",
+}
+
+
+def is_retryable(error) -> bool:
+    """Classify a retry-queue error as transient (True) or permanent (False).
+
+    429, 408 and 5xx statuses are transient, other 4xx are permanent
+    (invalid model, context too long, bad request). Without a status,
+    the error code decides.
+    """
+    if not isinstance(error, dict):
+        return False
+    status = error.get("status_code")
+    if status:
+        return status in (408, 429) or status >= 500
+    code = str(error.get("code") or error.get("type") or "").lower()
+    return code in RETRYABLE_CODES
+
+
+def split_retry_queue(retry_queue: list[dict]) -> tuple[list[str], list[dict]]:
+    """Deduplicate a retry queue into (retryable custom_ids, permanent failure entries)."""
+    retryable: dict[str, None] = {}
+    permanent: dict[str, dict] = {}
+    for entry in retry_queue:
+        custom_id = entry["custom_id"]
+        if custom_id is None:
+            continue
+        if is_retryable(entry["error"]):
+            retryable[custom_id] = None
+        else:
+            permanent[custom_id] = entry
+    # A permanent failure wins over a transient one reported for the same id.
+    return [c for c in retryable if c not in permanent], list(permanent.values())
+
+
+def iter_requests_for(manifest: dict, custom_ids: list[str]) -> Iterator[dict]:
+    """Re-read the original request lines for `custom_ids` from a job's shard files."""
+    wanted = set(custom_ids)
+    shard_indexes = {manifest["custom_ids"][c] for c in wanted if c in manifest["custom_ids"]}
+    for shard in manifest["shards"]:
+        if shard["index"] in shard_indexes:
+            for request in iter_file_records(shard["path"]):
+                if request["custom_id"] in wanted:
+                    yield request
+
+
+def merge_results(results_dirs: list[str], custom_ids: dict[str, int], path: str) -> int:
+    """Concatenate per-shard Parquet files from all rounds into one file, keyed to the primary shards."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    rows = 0
+    with pq.ParquetWriter(path + ".tmp", ParquetResultWriter.arrow_schema()) as writer:
+        for results_dir in results_dirs:
+            for name in sorted(os.listdir(results_dir)):
+                if not name.endswith(".parquet"):
+                    continue
+                table = pq.read_table(os.path.join(results_dir, name))
+                shards = pa.array([custom_ids.get(c) for c in table.column("custom_id").to_pylist()], pa.int32())
+                writer.write_table(table.set_column(table.schema.get_field_index("shard"), "shard", shards))
+                rows += table.num_rows
+    os.replace(path + ".tmp", path)
+    return rows
+
+
+async def run_with_retries(
+    job_id: str,
+    requests: Iterable[dict],
+    work_dir: str,
+    store: CheckpointStore,
+    max_retry_rounds: int = 2,
+    **pipeline_kwargs,
+) -> dict:
+    """Run a job, then resubmit its retryable failures as follow-up batches.
+
+    Each round is its own checkpointed job (`<job_id>-retry-N`) containing
+    only the deduplicated retryable custom_ids from the previous round, so
+    the whole sequence resumes after a crash. Results from every round are
+    merged into `<work_dir>/merged.parquet`. Rows still failing after
+    `max_retry_rounds` are reported as `unresolved`.
+    """
+    summary = await run_pipeline(job_id, requests, work_dir, store, **pipeline_kwargs)
+    primary_ids = load_manifest(store.manifest_path(job_id))["custom_ids"]
+    results_dirs = [summary["results_dir"]]
+    permanent: list[dict] = []
+    round_job, retryable = job_id, []
+
+    for round_number in range(1, max_retry_rounds + 2):
+        retryable, failed = split_retry_queue(summary["retry_queue"])
+        permanent.extend(failed)
+        if not retryable or round_number > max_retry_rounds:
+            break
+        print(f"Retry round {round_number}: resubmitting {len(retryable)} requests")
+        previous_manifest = load_manifest(store.manifest_path(round_job))
+        round_job = f"{job_id}-retry-{round_number}"
+        summary = await run_pipeline(
+            round_job,
+            iter_requests_for(previous_manifest, retryable),
+            os.path.join(work_dir, f"retry-{round_number}"),
+            store,
+            **pipeline_kwargs,
+        )
+        results_dirs.append(summary["results_dir"])
+
+    merged_path = os.path.join(work_dir, "merged.parquet")
+    rows = merge_results(results_dirs, primary_ids, merged_path)
+    print(f"Merged {rows} results into {merged_path}; "
+          f"{len(permanent)} permanent failures, {len(retryable)} unresolved")
+    return {
+        "merged_path": merged_path,
+        "rows": rows,
+        "rounds": len(results_dirs) - 1,
+        "permanent_failures": permanent,
+        "unresolved": retryable,
+    }
+
+
+if __name__ == "__main__":
+    # Any iterable works here — e.g. a generator reading prompts from a large file.
+    # It is only consumed the first time; reruns resume from the checkpoint.
+    prompts = (f"Write a one-line fun fact about the number {i}." for i in range(120))
+
+    store = CheckpointStore("batch_checkpoints.sqlite")
+    summary = asyncio.run(run_with_retries(
+        job_id="fun-facts",
+        requests=iter_chat_requests(prompts),
+        work_dir="batch_job_fun_facts",
+        store=store,
+        max_retry_rounds=2,
+        max_lines=50,  # small limit to demonstrate sharding
+    ))
+    print(f"{summary['rows']} results in {summary['merged_path']} after {summary['rounds']} retry rounds")
+    for entry in summary["permanent_failures"][:5]:
+        print(f"  permanent failure {entry['custom_id']}: {entry['error']}")
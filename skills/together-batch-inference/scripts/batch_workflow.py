@@ -15,9 +15,9 @@ Requires:
 import json
 import time
 import tempfile
-from together import Together
+from _together_client import get_client
 
-client = Together()
+client = get_client()
 
 # --- 1. Prepare batch input file ---
 requests = [
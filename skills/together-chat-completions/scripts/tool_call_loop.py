@@ -3,7 +3,14 @@
 Together AI Function Calling — Complete Tool Call Loop (v2 SDK)
 
 Defines tools, sends a request, executes function calls, and passes
-results back to the model for a final response. Handles parallel calls.
+results back to the model until it stops calling tools. Parallel calls
+in one turn run concurrently (thread pool or asyncio) with per-tool
+timeouts, and results are appended in the model's original order. A
+streaming variant starts each tool as soon as its arguments finish
+streaming. Idempotent tools can opt in to a TTL/LRU result cache so
+repeated calls skip execution, long runs can compact old tool
+outputs to stay under a token budget, and model calls can go through a
+local exact/semantic response cache (_response_cache.py).
 
 Usage:
     python tool_call_loop.py
@@ -13,10 +20,21 @@ Requires:
     export TOGETHER_API_KEY=your_key
 """
 
+import asyncio
+import inspect
 import json
-from together import Together
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from types import SimpleNamespace
 
-client = Together()
+from _response_cache import ResponseCache, embedder
+from _together_client import get_async_client, get_client
+
+MODEL = "meta-llama/Llama-3.3-70B-Instruct-Turbo"
 
 # --- 1. Define tools ---
 tools = [
@@ -68,47 +86,466 @@ FUNCTIONS = {
     "get_stock_price": get_stock_price,
 }
 
+# Per-tool timeouts in seconds; tools not listed use DEFAULT_TOOL_TIMEOUT.
+TOOL_TIMEOUTS = {
+    "get_weather": 10.0,
+    "get_stock_price": 5.0,
+}
+DEFAULT_TOOL_TIMEOUT = 30.0
 
-# --- 3. Send request with tools ---
-messages = [
-    {"role": "system", "content": "You are a helpful assistant with access to weather and stock tools."},
-    {"role": "user", "content": "What's the weather in NYC and the current Apple stock price?"},
-]
+# Tools whose results may be reused, with a TTL in seconds. Only list
+# idempotent tools; anything not listed always executes. Errors, raised
+# or returned as {"error": ...}, are never cached.
+CACHEABLE_TOOLS = {
+    "get_weather": 600.0,
+    "get_stock_price": 15.0,
+}
+
+
+class ToolResultCache:
+    """LRU + TTL cache of tool results keyed by tool name and canonicalized arguments.
+
+    Arguments are bound to the function signature with defaults applied,
+    so get_weather("NYC") and get_weather("NYC", unit="fahrenheit") share
+    an entry. With `path`, entries are persisted as JSON and reloaded on
+    start, so results survive across sessions.
+    """
+
+    def __init__(self, max_entries: int = 1024, path: str | None = None):
+        self.max_entries = max_entries
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[str, tuple[float, object]] = OrderedDict()  # key -> (expires_at, result)
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                now = time.time()
+                self._entries.update((k, (exp, v)) for k, exp, v in json.load(f) if exp > now)
+
+    @staticmethod
+    def key(fn, name: str, args: dict) -> str | None:
+        """Canonical cache key, or None if the arguments don't bind to the function."""
+        try:
+            bound = inspect.signature(fn).bind(**args)
+        except TypeError:
+            return None
+        bound.apply_defaults()
+        return name + ":" + json.dumps(bound.arguments, sort_keys=True, separators=(",", ":"), default=str)
+
+    def get(self, key: str) -> tuple[bool, object]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.time():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def put(self, key: str, result, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            if self.path:
+                self._save()
+
+    def _save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump([[k, exp, v] for k, (exp, v) in self._entries.items()], f, default=str)
+        os.replace(tmp_path, self.path)
+
+    def metrics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+
+# Pass path="tool_cache.json" to persist results across runs.
+TOOL_CACHE = ToolResultCache()
+
+
+# --- 3. Execute tool calls concurrently ---
+def _parse_arguments(tc) -> dict:
+    return json.loads(tc.function.arguments or "{}")
 
-response = client.chat.completions.create(
-    model="meta-llama/Llama-3.3-70B-Instruct-Turbo",
-    messages=messages,
-    tools=tools,
-)
 
-# --- 4. Process tool calls (handles parallel calls) ---
-tool_calls = response.choices[0].message.tool_calls
+def _tool_message(tc, result) -> dict:
+    return {
+        "role": "tool",
+        "tool_call_id": tc.id,
+        "content": json.dumps(result),
+    }
 
-if tool_calls:
-    # Add assistant message with tool calls to history
-    messages.append(response.choices[0].message)
 
+def _cache_lookup(fn, tc, args: dict) -> tuple[str | None, bool, object]:
+    """Return (cache key, hit, result) for a call; the key is None for non-cacheable tools."""
+    if tc.function.name not in CACHEABLE_TOOLS:
+        return None, False, None
+    key = ToolResultCache.key(fn, tc.function.name, args)
+    if key is None:
+        return None, False, None
+    hit, result = TOOL_CACHE.get(key)
+    return key, hit, result
+
+
+def _cache_store(key: str | None, tc, result):
+    """Cache a successful result; returned errors would otherwise be replayed until they expire."""
+    if key and not (isinstance(result, dict) and "error" in result):
+        TOOL_CACHE.put(key, result, CACHEABLE_TOOLS[tc.function.name])
+
+
+def _run_tool(tc):
+    """Run one tool call synchronously; errors are returned to the model instead of raised."""
+    fn = FUNCTIONS.get(tc.function.name)
+    if fn is None:
+        return {"error": f"Unknown tool: {tc.function.name}"}
+    try:
+        args = _parse_arguments(tc)
+        key, hit, result = _cache_lookup(fn, tc, args)
+        if hit:
+            return result
+        result = fn(**args)
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+    _cache_store(key, tc, result)
+    return result
+
+
+def _collect_results(dispatched) -> list[dict]:
+    """Wait for (tool_call, future, dispatched_at) triples in order, applying each tool's timeout."""
+    messages = []
+    for tc, future, dispatched_at in dispatched:
+        timeout = TOOL_TIMEOUTS.get(tc.function.name, DEFAULT_TOOL_TIMEOUT)
+        try:
+            result = future.result(timeout=max(0.0, timeout - (time.monotonic() - dispatched_at)))
+        except FutureTimeoutError:
+            result = {"error": f"{tc.function.name} timed out after {timeout:g}s"}
+        messages.append(_tool_message(tc, result))
+    return messages
+
+
+def execute_tool_calls(tool_calls, max_workers: int = 8) -> list[dict]:
+    """Run one turn's tool calls on a thread pool. Returns tool messages in call order.
+
+    The turn takes as long as the slowest call rather than the sum of all
+    calls. A call that exceeds its timeout is reported to the model as an
+    error; its thread is abandoned, not killed.
+    """
     for tc in tool_calls:
-        fn_name = tc.function.name
-        fn_args = json.loads(tc.function.arguments)
-
-        print(f"Calling {fn_name}({fn_args})")
-        result = FUNCTIONS[fn_name](**fn_args)
-
-        # Add each tool result to history
-        messages.append({
-            "role": "tool",
-            "tool_call_id": tc.id,
-            "content": json.dumps(result),
-        })
-
-    # --- 5. Get final response with tool results ---
-    final = client.chat.completions.create(
-        model="meta-llama/Llama-3.3-70B-Instruct-Turbo",
+        print(f"Calling {tc.function.name}({tc.function.arguments})")
+    pool = ThreadPoolExecutor(max_workers=min(max_workers, len(tool_calls)) or 1)
+    try:
+        started = time.monotonic()
+        return _collect_results([(tc, pool.submit(_run_tool, tc), started) for tc in tool_calls])
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def _arun_tool(tc):
+    """Run one tool call with its timeout; coroutine tools are awaited, plain ones run in a thread."""
+    fn = FUNCTIONS.get(tc.function.name)
+    timeout = TOOL_TIMEOUTS.get(tc.function.name, DEFAULT_TOOL_TIMEOUT)
+    if fn is None:
+        return {"error": f"Unknown tool: {tc.function.name}"}
+    try:
+        args = _parse_arguments(tc)
+        key, hit, result = _cache_lookup(fn, tc, args)
+        if hit:
+            return result
+        call = fn(**args) if inspect.iscoroutinefunction(fn) else asyncio.to_thread(fn, **args)
+        result = await asyncio.wait_for(call, timeout)
+    except asyncio.TimeoutError:
+        return {"error": f"{tc.function.name} timed out after {timeout:g}s"}
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+    _cache_store(key, tc, result)
+    return result
+
+
+async def aexecute_tool_calls(tool_calls) -> list[dict]:
+    """Asyncio variant of `execute_tool_calls`."""
+    for tc in tool_calls:
+        print(f"Calling {tc.function.name}({tc.function.arguments})")
+    results = await asyncio.gather(*(_arun_tool(tc) for tc in tool_calls))
+    return [_tool_message(tc, result) for tc, result in zip(tool_calls, results)]
+
+
+# --- 4. Keep the conversation under a token budget ---
+def estimate_tokens(message) -> int:
+    """Rough token count for one message (~4 characters per token plus framing)."""
+    if not isinstance(message, dict):
+        message = message.model_dump(exclude_none=True)
+    return len(json.dumps(message, default=str)) // 4 + 4
+
+
+def summarize_tool_output(content: str) -> str:
+    """Example summarizer for `ConversationContext`: condense a tool result with a small model."""
+    response = get_client().chat.completions.create(
+        model="meta-llama/Meta-Llama-3.1-8B-Instruct-Turbo",
+        messages=[
+            {"role": "system", "content": "Summarize this tool output in under 60 words. Keep every number and identifier."},
+            {"role": "user", "content": content},
+        ],
+        max_tokens=120,
+    )
+    return response.choices[0].message.content
+
+
+COMPACTED_MARKERS = ("[summarized tool output]", "[truncated tool output,")
+
+
+class ConversationContext:
+    """Compacts a tool-loop conversation once it exceeds `max_tokens`.
+
+    The system prompt and the last `keep_recent` messages are never touched.
+    Older tool outputs are first replaced by a preview (or by
+    `summarize(content)` when given); if that is not enough, the oldest
+    assistant tool-call messages are dropped together with all of their
+    tool results, so every tool_call_id still has a matching call.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 16_000,
+        keep_recent: int = 6,
+        preview_chars: int = 200,
+        summarize=None,
+    ):
+        self.max_tokens = max_tokens
+        self.keep_recent = keep_recent
+        self.preview_chars = preview_chars
+        self.summarize = summarize
+        self.token_counts: list[int] = []
+
+    def _needs_shrink(self, message) -> bool:
+        # Decided from the content itself: already-compacted outputs carry a marker,
+        # and short ones would only grow with a prefix or summary.
+        if not (isinstance(message, dict) and message.get("role") == "tool"):
+            return False
+        content = message["content"]
+        return len(content) > self.preview_chars and not content.startswith(COMPACTED_MARKERS)
+
+    def _shrink(self, message: dict) -> dict:
+        content = message["content"]
+        if self.summarize:
+            text = f"[summarized tool output] {self.summarize(content)}"
+        else:
+            text = f"[truncated tool output, {len(content)} chars] {content[:self.preview_chars]}"
+        return {**message, "content": text}
+
+    def compact(self, messages: list) -> int:
+        """Compact `messages` in place if needed. Returns the estimated token total."""
+        self.token_counts = [estimate_tokens(m) for m in messages]
+        total = sum(self.token_counts)
+        cutoff = max(0, len(messages) - self.keep_recent)
+
+        # Pass 1: shrink old tool outputs, oldest first.
+        for i in range(cutoff):
+            if total <= self.max_tokens:
+                return total
+            if self._needs_shrink(messages[i]):
+                messages[i] = self._shrink(messages[i])
+                new_count = estimate_tokens(messages[i])
+                total += new_count - self.token_counts[i]
+                self.token_counts[i] = new_count
+
+        # Pass 2: drop whole tool exchanges (assistant call + its results), oldest first.
+        i = 0
+        while total > self.max_tokens and i < cutoff:
+            m = messages[i]
+            tool_calls = m.get("tool_calls") if isinstance(m, dict) else getattr(m, "tool_calls", None)
+            if not tool_calls:
+                i += 1
+                continue
+            end = i + 1
+            while end < len(messages) and isinstance(messages[end], dict) and messages[end].get("role") == "tool":
+                end += 1
+            if end > cutoff:
+                break
+            total -= sum(self.token_counts[i:end])
+            del messages[i:end]
+            del self.token_counts[i:end]
+            cutoff -= end - i
+        return total
+
+
+# --- 5. Loop until the model stops calling tools ---
+def run_tool_loop(
+    messages: list,
+    max_turns: int = 10,
+    context: ConversationContext | None = None,
+    cache: ResponseCache | None = None,
+) -> str:
+    """Call the model, execute any tool calls, and repeat until it answers directly.
+
+    With a `context`, the history is compacted before every model call;
+    with a `cache`, identical (or, for the opening user prompt, similar)
+    requests are answered from it.
+    """
+    for _ in range(max_turns):
+        if context:
+            context.compact(messages)
+        request = {"model": MODEL, "messages": messages, "tools": tools}
+        create = get_client().chat.completions.create
+        response = cache.create(create, **request) if cache else create(**request)
+        message = response.choices[0].message
+        if not message.tool_calls:
+            return message.content
+        # Add assistant message with tool calls to history, then each tool result
+        messages.append(message)
+        messages.extend(execute_tool_calls(message.tool_calls))
+    raise RuntimeError(f"Model still calling tools after {max_turns} turns")
+
+
+async def arun_tool_loop(
+    messages: list,
+    max_turns: int = 10,
+    context: ConversationContext | None = None,
+    cache: ResponseCache | None = None,
+) -> str:
+    """Asyncio variant of `run_tool_loop` using `AsyncTogether`."""
+    for _ in range(max_turns):
+        if context:
+            context.compact(messages)
+        request = {"model": MODEL, "messages": messages, "tools": tools}
+        create = get_async_client().chat.completions.create
+        response = await (cache.acreate(create, **request) if cache else create(**request))
+        message = response.choices[0].message
+        if not message.tool_calls:
+            return message.content
+        messages.append(message)
+        messages.extend(await aexecute_tool_calls(message.tool_calls))
+    raise RuntimeError(f"Model still calling tools after {max_turns} turns")
+
+
+# --- 6. Streaming variant: dispatch each call as soon as its arguments are complete ---
+def _arguments_complete(arguments: str) -> bool:
+    """True once streamed arguments form a complete JSON object."""
+    if not arguments.rstrip().endswith("}"):
+        return False
+    try:
+        json.loads(arguments)
+        return True
+    except json.JSONDecodeError:
+        return False
+
+
+def stream_tool_turn(messages: list, pool: ThreadPoolExecutor) -> tuple[dict, list[dict]]:
+    """Stream one model turn, starting each tool call while the rest of the response streams.
+
+    Argument fragments are assembled per tool-call index. A call is
+    dispatched when its arguments parse as JSON, when a later call starts,
+    or when the stream ends, whichever comes first. Returns the assistant
+    message and the tool messages (in call order).
+    """
+    stream = get_client().chat.completions.create(
+        model=MODEL,
         messages=messages,
         tools=tools,
+        stream=True,
     )
-    print(f"\nAssistant: {final.choices[0].message.content}")
-else:
-    # Model responded directly without calling tools
-    print(f"Assistant: {response.choices[0].message.content}")
+    content: list[str] = []
+    calls: dict[int, SimpleNamespace] = {}
+    dispatched: dict[int, tuple] = {}
+
+    def dispatch(index: int):
+        call = calls[index]
+        print(f"Calling {call.function.name}({call.function.arguments})")
+        dispatched[index] = (call, pool.submit(_run_tool, call), time.monotonic())
+
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        if delta.content:
+            content.append(delta.content)
+        for fragment in delta.tool_calls or []:
+            index = int(fragment.index)
+            if index not in calls:
+                # A new call starting means every earlier call's arguments are final.
+                for earlier in calls:
+                    if earlier not in dispatched:
+                        dispatch(earlier)
+                calls[index] = SimpleNamespace(
+                    id=None, type="function", function=SimpleNamespace(name="", arguments="")
+                )
+            call = calls[index]
+            call.id = call.id or fragment.id
+            if fragment.function:
+                if fragment.function.name:
+                    call.function.name = call.function.name or fragment.function.name
+                call.function.arguments += fragment.function.arguments or ""
+            if index not in dispatched and call.function.name and _arguments_complete(call.function.arguments):
+                dispatch(index)
+
+    for index in calls:
+        if index not in dispatched:
+            dispatch(index)
+
+    assistant = {"role": "assistant", "content": "".join(content) or None}
+    if calls:
+        assistant["tool_calls"] = [
+            {
+                "id": call.id,
+                "type": "function",
+                "function": {"name": call.function.name, "arguments": call.function.arguments},
+            }
+            for _, call in sorted(calls.items())
+        ]
+    return assistant, _collect_results([dispatched[i] for i in sorted(dispatched)])
+
+
+def run_streaming_tool_loop(
+    messages: list,
+    max_turns: int = 10,
+    max_workers: int = 8,
+    context: ConversationContext | None = None,
+) -> str:
+    """`run_tool_loop` with stream=True, overlapping model generation with tool execution."""
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        for _ in range(max_turns):
+            if context:
+                context.compact(messages)
+            assistant, tool_messages = stream_tool_turn(messages, pool)
+            if not tool_messages:
+                return assistant["content"]
+            messages.append(assistant)
+            messages.extend(tool_messages)
+        raise RuntimeError(f"Model still calling tools after {max_turns} turns")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    messages = [
+        {"role": "system", "content": "You are a helpful assistant with access to weather and stock tools."},
+        {"role": "user", "content": "What's the weather in NYC and the current Apple stock price?"},
+    ]
+    # Compact old tool outputs once the history passes ~8K tokens.
+    context = ConversationContext(max_tokens=8_000)
+    # Reuse model responses for repeated or near-identical prompts.
+    cache = ResponseCache("responses.sqlite", ttl=3600, embed=embedder(get_client()))
+    print(f"\nAssistant: {run_tool_loop(messages, context=context, cache=cache)}")
+    print(f"Tool cache: {TOOL_CACHE.metrics()}")
+    print(f"Response cache: {cache.stats()}")
+
+    # Same loop on the asyncio client:
+    # print(asyncio.run(arun_tool_loop(messages)))
+
+    # Streaming: tools start while the model is still generating later calls
+    # print(run_streaming_tool_loop(messages))
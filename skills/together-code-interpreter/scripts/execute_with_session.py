@@ -13,14 +13,12 @@ Requires:
     export TOGETHER_API_KEY=your_key
 """
 
-from together import Together
-
-client = Together()
+from _together_client import get_client
 
 
 def execute_code(code: str, session_id: str | None = None) -> dict:
     """Execute Python code, optionally in an existing session."""
-    response = client.code_interpreter.execute(
+    response = get_client().code_interpreter.execute(
         code=code,
         language="python",
         **({"session_id": session_id} if session_id else {}),
@@ -51,7 +49,7 @@ def execute_code(code: str, session_id: str | None = None) -> dict:
 
 def list_sessions():
     """List active code interpreter sessions."""
-    response = client.code_interpreter.sessions.list()
+    response = get_client().code_interpreter.sessions.list()
     for s in response.data.sessions:
         print(f"  Session {s.id}: {s.execute_count} executions, expires {s.expires_at}")
     return response.data.sessions
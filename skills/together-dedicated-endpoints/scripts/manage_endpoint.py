@@ -8,20 +8,22 @@ run inference, then stop/delete.
 Usage:
     python manage_endpoint.py
 
+Repeated prompts can be served from a local response cache; see
+`run_inference` and _response_cache.py.
+
 Requires:
     pip install together
     export TOGETHER_API_KEY=your_key
 """
 
 import time
-from together import Together
-
-client = Together()
+from _response_cache import ResponseCache, embedder
+from _together_client import get_client
 
 
 def list_hardware(model: str | None = None):
     """List available hardware options, optionally filtered by model."""
-    response = client.endpoints.list_hardware(model=model)
+    response = get_client().endpoints.list_hardware(model=model)
     for hw in response.data:
         status = hw.availability.status if hw.availability else "unknown"
         price = hw.pricing.cents_per_minute if hw.pricing else "N/A"
@@ -37,7 +39,7 @@ def create_endpoint(
     display_name: str | None = None,
 ):
     """Create a dedicated endpoint."""
-    endpoint = client.endpoints.create(
+    endpoint = get_client().endpoints.create(
         model=model,
         hardware=hardware,
         autoscaling={
@@ -54,7 +56,7 @@ def wait_for_ready(endpoint_id: str, timeout: int = 600, poll_interval: int = 10
     """Poll until endpoint reaches STARTED state."""
     elapsed = 0
     while elapsed < timeout:
-        endpoint = client.endpoints.retrieve(endpoint_id)
+        endpoint = get_client().endpoints.retrieve(endpoint_id)
         print(f"  State: {endpoint.state}  ({elapsed}s)")
 
         if endpoint.state == "STARTED":
@@ -66,13 +68,15 @@ def wait_for_ready(endpoint_id: str, timeout: int = 600, poll_interval: int = 10
     raise TimeoutError(f"Endpoint not ready after {timeout}s")
 
 
-def run_inference(endpoint_name: str, prompt: str):
-    """Send a chat completion to the dedicated endpoint."""
-    response = client.chat.completions.create(
-        model=endpoint_name,
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=200,
-    )
+def run_inference(endpoint_name: str, prompt: str, cache: ResponseCache | None = None):
+    """Send a chat completion to the dedicated endpoint, via `cache` if given."""
+    request = {
+        "model": endpoint_name,
+        "messages": [{"role": "user", "content": prompt}],
+        "max_tokens": 200,
+    }
+    create = get_client().chat.completions.create
+    response = cache.create(create, **request) if cache else create(**request)
     reply = response.choices[0].message.content
     print(f"Response: {reply}")
     return reply
@@ -80,14 +84,14 @@ def run_inference(endpoint_name: str, prompt: str):
 
 def stop_endpoint(endpoint_id: str):
     """Stop (but don't delete) an endpoint."""
-    endpoint = client.endpoints.update(endpoint_id, state="STOPPED")
+    endpoint = get_client().endpoints.update(endpoint_id, state="STOPPED")
     print(f"Stopped endpoint: {endpoint.id}  (state: {endpoint.state})")
     return endpoint
 
 
 def delete_endpoint(endpoint_id: str):
     """Permanently delete an endpoint."""
-    client.endpoints.delete(endpoint_id)
+    get_client().endpoints.delete(endpoint_id)
     print(f"Deleted endpoint: {endpoint_id}")
 
 
@@ -109,8 +113,12 @@ if __name__ == "__main__":
     # 3. Wait until ready
     ep = wait_for_ready(ep.id)
 
-    # 4. Run inference
-    run_inference(ep.name, "What is the capital of France?")
+    # 4. Run inference (the repeated and reworded prompts are served from the cache)
+    cache = ResponseCache("responses.sqlite", ttl=3600, embed=embedder(get_client()))
+    run_inference(ep.name, "What is the capital of France?", cache=cache)
+    run_inference(ep.name, "What is the capital of France?", cache=cache)
+    run_inference(ep.name, "what's the capital of france?", cache=cache)
+    print(f"Response cache: {cache.stats()}")
 
     # 5. Stop endpoint (comment out delete if you want to restart later)
     stop_endpoint(ep.id)
@@ -8,36 +8,328 @@ Usage:
     python embed_and_rerank.py
 
 Requires:
-    pip install together
+    pip install together numpy
     export TOGETHER_API_KEY=your_key
 """
 
+import hashlib
+import json
 import math
-from together import Together
+import os
+import random
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
-client = Together()
+import numpy as np
+from together import APIConnectionError, InternalServerError, RateLimitError
 
+from _together_client import get_client
 
-def embed_texts(texts: list[str], model: str = "BAAI/bge-base-en-v1.5") -> list[list[float]]:
-    """Embed a list of texts, returns list of embedding vectors."""
-    response = client.embeddings.create(
-        model=model,
-        input=texts,
-    )
-    return [item.embedding for item in response.data]
+
+class _ModelStore:
+    """One model's slice of the cache: a float32 vector memmap, a key memmap, and an LRU index."""
+
+    def __init__(self, directory: str, dim: int, max_entries: int):
+        self.directory = directory
+        self.dim = dim
+        self.max_entries = max_entries
+        self.index_path = os.path.join(directory, "index.json")
+        self.lru: OrderedDict[str, int] = OrderedDict()  # hex digest -> slot, oldest first
+        self.capacity = 0
+        self.vectors = None
+        self.keys = None
+
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                index = json.load(f)
+            if index["dim"] == dim:
+                self._open(index["capacity"])
+                self.lru = OrderedDict((digest, slot) for digest, slot in index["entries"])
+        if self.vectors is None:
+            self._open(min(1024, max_entries))
+
+    def _open(self, capacity: int):
+        """(Re)map the data files at the given capacity, growing them if needed."""
+        for name, row_bytes in (("vectors.f32", self.dim * 4), ("keys.bin", 32)):
+            path = os.path.join(self.directory, name)
+            with open(path, "ab") as f:
+                if f.tell() < capacity * row_bytes:
+                    f.truncate(capacity * row_bytes)
+        self.vectors = np.memmap(
+            os.path.join(self.directory, "vectors.f32"),
+            dtype=np.float32, mode="r+", shape=(capacity, self.dim),
+        )
+        self.keys = np.memmap(
+            os.path.join(self.directory, "keys.bin"),
+            dtype="S32", mode="r+", shape=(capacity,),
+        )
+        self.capacity = capacity
+
+    def get(self, digest: str) -> np.ndarray | None:
+        slot = self.lru.get(digest)
+        # The key file guards against an index that is older than the vectors.
+        if slot is None or self.keys[slot] != bytes.fromhex(digest):
+            return None
+        self.lru.move_to_end(digest)
+        return np.array(self.vectors[slot])
+
+    def put(self, digest: str, vector) -> int:
+        """Store a vector, evicting the least-recently-used entry when full. Returns evictions."""
+        evicted = 0
+        slot = self.lru.pop(digest, None)
+        if slot is None:
+            if len(self.lru) < self.capacity:
+                slot = len(self.lru)
+            elif self.capacity < self.max_entries:
+                slot = len(self.lru)
+                self._open(min(self.capacity * 2, self.max_entries))
+            else:
+                _, slot = self.lru.popitem(last=False)
+                evicted = 1
+        self.vectors[slot] = vector
+        self.keys[slot] = bytes.fromhex(digest)
+        self.lru[digest] = slot
+        return evicted
+
+    def flush(self):
+        self.vectors.flush()
+        self.keys.flush()
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "dim": self.dim,
+                "capacity": self.capacity,
+                "entries": list(self.lru.items()),
+            }, f)
+        os.replace(tmp_path, self.index_path)
+
+
+class EmbeddingCache:
+    """Persistent, content-addressed embedding cache keyed by (model, sha256(text)).
+
+    Vectors live in a memory-mapped float32 file per model next to a small
+    JSON index that also records LRU order. Each model keeps at most
+    `max_entries` vectors; the least recently used ones are overwritten first.
+
+        cache = EmbeddingCache(".embedding_cache")
+        vectors = embed_texts(texts, cache=cache)
+        print(cache.stats())
+    """
+
+    def __init__(self, cache_dir: str, max_entries: int = 1_000_000):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._stores: dict[str, _ModelStore] = {}
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _store(self, model: str, dim: int | None = None) -> _ModelStore | None:
+        store = self._stores.get(model)
+        if store is None:
+            directory = os.path.join(self.cache_dir, hashlib.sha256(model.encode("utf-8")).hexdigest()[:16])
+            index_path = os.path.join(directory, "index.json")
+            if dim is None:
+                if not os.path.exists(index_path):
+                    return None
+                with open(index_path) as f:
+                    dim = json.load(f)["dim"]
+            store = self._stores[model] = _ModelStore(directory, dim, self.max_entries)
+        return store
+
+    def get_many(self, model: str, texts: list[str]) -> list[np.ndarray | None]:
+        """Look up texts; returns a vector per text, or None for cache misses."""
+        store = self._store(model)
+        found = [store.get(self.key(t)) if store else None for t in texts]
+        hits = sum(v is not None for v in found)
+        self.hits += hits
+        self.misses += len(texts) - hits
+        return found
+
+    def put_many(self, model: str, texts: list[str], vectors) -> None:
+        """Insert vectors for texts under the given model."""
+        if not texts:
+            return
+        store = self._store(model, dim=len(vectors[0]))
+        for text, vector in zip(texts, vectors):
+            self.evictions += store.put(self.key(text), vector)
+
+    def flush(self) -> None:
+        """Persist vectors and indexes to disk."""
+        for store in self._stores.values():
+            store.flush()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": sum(len(s.lru) for s in self._stores.values()),
+        }
+
+
+# Errors worth retrying a chunk for; anything else (bad input, auth) fails fast.
+RETRYABLE_ERRORS = (APIConnectionError, RateLimitError, InternalServerError)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) used for chunk budgeting."""
+    return len(text) // 4 + 1
+
+
+def chunk_texts(
+    texts: list[str],
+    max_batch_size: int = 128,
+    max_batch_tokens: int = 16_384,
+) -> list[tuple[int, int]]:
+    """Split texts into contiguous (start, end) spans bounded by item count and estimated tokens.
+
+    A single text larger than the token budget still gets its own chunk.
+    """
+    spans = []
+    start, tokens = 0, 0
+    for i, text in enumerate(texts):
+        cost = estimate_tokens(text)
+        if i > start and (i - start >= max_batch_size or tokens + cost > max_batch_tokens):
+            spans.append((start, i))
+            start, tokens = i, 0
+        tokens += cost
+    if start < len(texts):
+        spans.append((start, len(texts)))
+    return spans
+
+
+def _embed_chunk(texts: list[str], model: str, max_retries: int) -> list[list[float]]:
+    """Embed one chunk, retrying transient errors with exponential backoff and jitter."""
+    for attempt in range(max_retries + 1):
+        try:
+            response = get_client().embeddings.create(
+                model=model,
+                input=texts,
+            )
+            return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+        except RETRYABLE_ERRORS:
+            if attempt == max_retries:
+                raise
+            time.sleep(min(30.0, 2 ** attempt) * random.uniform(0.5, 1.0))
+
+
+def _embed_uncached(
+    texts: list[str],
+    model: str,
+    max_batch_size: int,
+    max_batch_tokens: int,
+    max_workers: int,
+    max_retries: int,
+) -> list[list[float]]:
+    """Chunk texts and embed the chunks concurrently, preserving input order."""
+    spans = chunk_texts(texts, max_batch_size, max_batch_tokens)
+    chunks = [texts[start:end] for start, end in spans]
+    if len(chunks) <= 1 or max_workers <= 1:
+        results = [_embed_chunk(chunk, model, max_retries) for chunk in chunks]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as pool:
+            results = list(pool.map(lambda chunk: _embed_chunk(chunk, model, max_retries), chunks))
+    return [vector for chunk_result in results for vector in chunk_result]
+
+
+def embed_texts(
+    texts: list[str],
+    model: str = "BAAI/bge-base-en-v1.5",
+    cache: EmbeddingCache | None = None,
+    max_batch_size: int = 128,
+    max_batch_tokens: int = 16_384,
+    max_workers: int = 4,
+    max_retries: int = 3,
+) -> list[list[float]]:
+    """Embed a list of texts, returns list of embedding vectors.
+
+    Input is split into chunks of at most `max_batch_size` texts and
+    roughly `max_batch_tokens` tokens, sent on up to `max_workers` threads,
+    and reassembled in input order. With a `cache`, only texts that are not
+    already cached for `model` are sent to the API (each distinct text once).
+    """
+    batching = (max_batch_size, max_batch_tokens, max_workers, max_retries)
+    if cache is None:
+        return _embed_uncached(texts, model, *batching)
+
+    found = cache.get_many(model, texts)
+    missing = list(dict.fromkeys(t for t, v in zip(texts, found) if v is None))
+    if missing:
+        fresh = dict(zip(missing, _embed_uncached(missing, model, *batching)))
+        cache.put_many(model, missing, list(fresh.values()))
+        cache.flush()
+        found = [v if v is not None else fresh[t] for t, v in zip(texts, found)]
+    return [v.tolist() if isinstance(v, np.ndarray) else list(v) for v in found]
 
 
 def cosine_similarity(a: list[float], b: list[float]) -> float:
-    """Compute cosine similarity between two vectors."""
+    """Compute cosine similarity between two vectors (pure-Python reference)."""
     dot = sum(x * y for x, y in zip(a, b))
     norm_a = math.sqrt(sum(x * x for x in a))
     norm_b = math.sqrt(sum(x * x for x in b))
     return dot / (norm_a * norm_b) if norm_a and norm_b else 0.0
 
 
+def normalize_rows(vectors) -> np.ndarray:
+    """Stack vectors into a C-contiguous float32 matrix with unit-length rows.
+
+    Zero vectors stay zero, so they score 0.0 like `cosine_similarity`.
+    Normalize the document matrix once and reuse it for every query.
+    """
+    matrix = np.array(vectors, dtype=np.float32, order="C", ndmin=2)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+def top_k_similar(
+    query_embs,
+    doc_matrix: np.ndarray,
+    k: int = 5,
+    batch_size: int = 1024,
+) -> list[list[dict]]:
+    """Score queries against a normalized document matrix and return the top k per query.
+
+    `doc_matrix` must come from `normalize_rows`. Queries are scored in
+    batches of `batch_size` (one matmul each) to bound memory, and top-k
+    selection uses `argpartition` so only the k winners are sorted.
+    """
+    queries = normalize_rows(query_embs)
+    n_docs = doc_matrix.shape[0]
+    k = min(k, n_docs)
+    if k <= 0:
+        return [[] for _ in range(len(queries))]
+
+    results = []
+    for start in range(0, len(queries), batch_size):
+        scores = queries[start:start + batch_size] @ doc_matrix.T
+        if k < n_docs:
+            top = np.argpartition(scores, n_docs - k, axis=1)[:, n_docs - k:]
+        else:
+            top = np.broadcast_to(np.arange(n_docs), scores.shape)
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        for indices, row_scores in zip(top.tolist(), top_scores.tolist()):
+            results.append([
+                {"index": i, "score": score} for i, score in zip(indices, row_scores)
+            ])
+    return results
+
+
 def rerank_documents(query: str, documents: list[str], top_n: int = 3) -> list[dict]:
     """Rerank documents by relevance to a query."""
-    response = client.rerank.create(
+    response = get_client().rerank.create(
         model="mixedbread-ai/Mxbai-Rerank-Large-V2",
         query=query,
         documents=documents,
@@ -62,7 +354,10 @@ if __name__ == "__main__":
     ]
     query = "What language is good for data science?"
 
-    embeddings = embed_texts(texts + [query])
+    # Repeat runs are served from the on-disk cache; only new texts hit the API.
+    cache = EmbeddingCache(".embedding_cache")
+    embeddings = embed_texts(texts + [query], cache=cache)
+    print(f"Cache: {cache.stats()}")
     query_emb = embeddings[-1]
     doc_embs = embeddings[:-1]
 
@@ -71,6 +366,12 @@ if __name__ == "__main__":
         sim = cosine_similarity(query_emb, doc_embs[i])
         print(f"  {sim:.4f} — {text}")
 
+    # --- Example: Vectorized top-k over a normalized document matrix ---
+    doc_matrix = normalize_rows(doc_embs)
+    print("\nTop 2 by matrix search:")
+    for hit in top_k_similar([query_emb], doc_matrix, k=2)[0]:
+        print(f"  {hit['score']:.4f} — {texts[hit['index']]}")
+
     # --- Example: Rerank for better precision ---
     documents = [
         "Python is widely used in data science and machine learning.",
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Together AI Retrieve-then-Rerank with a Local IVF Index (v2 SDK)
+
+Build an on-disk approximate-nearest-neighbour (IVF) index from
+`embed_texts` output, pull the top-N candidates locally, and send only
+those to the reranker. Includes a recall@k / latency benchmark against
+exact search.
+
+Usage:
+    python retrieve_and_rerank.py
+    python retrieve_and_rerank.py --benchmark [n_docs] [dim]
+
+Requires:
+    pip install together numpy
+    export TOGETHER_API_KEY=your_key
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+from embed_and_rerank import embed_texts, normalize_rows, rerank_documents, top_k_similar
+
+
+class IVFIndex:
+    """Inverted-file index over unit-length float32 vectors.
+
+    Vectors are clustered with spherical k-means; each cluster ("list") is
+    stored contiguously so a query only scans the `n_probe` lists whose
+    centroids are closest to it. Saved as plain .npy files so `load` can
+    memory-map the vectors instead of reading them into RAM.
+    """
+
+    def __init__(self, centroids: np.ndarray, vectors: np.ndarray, ids: np.ndarray, offsets: np.ndarray):
+        self.centroids = centroids  # (n_lists, dim)
+        self.vectors = vectors      # (n_docs, dim), grouped by list
+        self.ids = ids              # original document index for each row of `vectors`
+        self.offsets = offsets      # list i spans rows offsets[i]:offsets[i + 1]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, query_embs, k: int = 10, n_probe: int = 8) -> list[list[dict]]:
+        """Approximate top-k per query, same shape as `top_k_similar` output."""
+        queries = normalize_rows(query_embs)
+        n_probe = min(n_probe, len(self.centroids))
+        centroid_scores = queries @ self.centroids.T
+        probes = np.argpartition(centroid_scores, -n_probe, axis=1)[:, -n_probe:]
+
+        results = []
+        for query, lists in zip(queries, probes):
+            spans = [(self.offsets[i], self.offsets[i + 1]) for i in lists]
+            rows = np.concatenate([np.arange(start, end) for start, end in spans])
+            if len(rows) == 0:
+                results.append([])
+                continue
+            scores = np.concatenate([self.vectors[start:end] @ query for start, end in spans])
+            top = min(k, len(rows))
+            best = np.argpartition(scores, len(scores) - top)[len(scores) - top:]
+            best = best[np.argsort(-scores[best], kind="stable")]
+            results.append([
+                {"index": int(self.ids[rows[i]]), "score": float(scores[i])} for i in best
+            ])
+        return results
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        for name in ("centroids", "vectors", "ids", "offsets"):
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "IVFIndex":
+        mode = "r" if mmap else None
+        arrays = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mode)
+            for name in ("centroids", "vectors", "ids", "offsets")
+        }
+        return cls(**arrays)
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, batch_size: int = 8192) -> np.ndarray:
+    """Nearest centroid (by inner product) for every vector, in batches to bound memory."""
+    labels = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), batch_size):
+        labels[start:start + batch_size] = np.argmax(vectors[start:start + batch_size] @ centroids.T, axis=1)
+    return labels
+
+
+def build_ivf_index(
+    embeddings,
+    n_lists: int | None = None,
+    n_iter: int = 10,
+    train_size: int = 100_000,
+    seed: int = 0,
+) -> IVFIndex:
+    """Cluster embeddings with spherical k-means and build an IVF index.
+
+    `n_lists` defaults to ~sqrt(n_docs). Centroids are trained on a random
+    sample of at most `train_size` vectors, then every vector is assigned.
+    """
+    vectors = normalize_rows(embeddings)
+    n_docs = len(vectors)
+    n_lists = n_lists or max(1, int(np.sqrt(n_docs)))
+    n_lists = min(n_lists, n_docs)
+    rng = np.random.default_rng(seed)
+
+    sample = vectors[rng.choice(n_docs, size=min(train_size, n_docs), replace=False)]
+    centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+    for _ in range(n_iter):
+        labels = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        empty = np.bincount(labels, minlength=n_lists) == 0
+        # Re-seed empty clusters from random samples so every list stays useful.
+        sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+        centroids = normalize_rows(sums)
+
+    labels = _assign(vectors, centroids)
+    order = np.argsort(labels, kind="stable")
+    offsets = np.zeros(n_lists + 1, dtype=np.int64)
+    np.cumsum(np.bincount(labels, minlength=n_lists), out=offsets[1:])
+    return IVFIndex(centroids, np.ascontiguousarray(vectors[order]), order.astype(np.int64), offsets)
+
+
+def retrieve_and_rerank(
+    query: str,
+    documents: list[str],
+    index: IVFIndex,
+    n_candidates: int = 50,
+    top_n: int = 5,
+    n_probe: int = 8,
+) -> list[dict]:
+    """Retrieve candidates from the local index, then rerank only those."""
+    query_emb = embed_texts([query])[0]
+    candidates = [hit["index"] for hit in index.search([query_emb], k=n_candidates, n_probe=n_probe)[0]]
+    ranked = rerank_documents(query, [documents[i] for i in candidates], top_n=top_n)
+    for r in ranked:
+        r["index"] = candidates[r["index"]]
+    return ranked
+
+
+def benchmark(
+    n_docs: int = 200_000,
+    dim: int = 768,
+    n_queries: int = 100,
+    k: int = 10,
+    n_probes: tuple[int, ...] = (1, 4, 8, 16, 32),
+    seed: int = 0,
+):
+    """Compare IVF search against exact `top_k_similar` on synthetic clustered vectors."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, n_docs // 500), dim)).astype(np.float32)
+    docs = centers[rng.integers(len(centers), size=n_docs)]
+    docs += 0.5 * rng.standard_normal(docs.shape).astype(np.float32)
+    queries = docs[rng.choice(n_docs, size=n_queries, replace=False)]
+    queries = queries + 0.5 * rng.standard_normal(queries.shape).astype(np.float32)
+
+    started = time.perf_counter()
+    index = build_ivf_index(docs, seed=seed)
+    print(f"Built IVF index: {n_docs} x {dim}, {len(index.centroids)} lists "
+          f"in {time.perf_counter() - started:.1f}s")
+
+    doc_matrix = normalize_rows(docs)
+    started = time.perf_counter()
+    exact = [top_k_similar([q], doc_matrix, k=k)[0] for q in queries]
+    exact_ms = (time.perf_counter() - started) * 1000 / n_queries
+    truth = [{hit["index"] for hit in hits} for hits in exact]
+    print(f"  exact        recall@{k}=1.000  {exact_ms:8.2f} ms/query")
+
+    for n_probe in n_probes:
+        started = time.perf_counter()
+        approx = [index.search([q], k=k, n_probe=n_probe)[0] for q in queries]
+        approx_ms = (time.perf_counter() - started) * 1000 / n_queries
+        recall = np.mean([
+            len(t & {hit["index"] for hit in hits}) / len(t) for t, hits in zip(truth, approx)
+        ])
+        print(f"  n_probe={n_probe:<4} recall@{k}={recall:.3f}  {approx_ms:8.2f} ms/query")
+
+
+if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        args = [int(a) for a in sys.argv[sys.argv.index("--benchmark") + 1:]]
+        benchmark(*args[:2])
+        sys.exit(0)
+
+    documents = [
+        "Python is widely used in data science and machine learning.",
+        "Java is a popular language for enterprise applications.",
+        "R is a language designed for statistical computing.",
+        "JavaScript powers most web applications.",
+        "SQL is essential for database querying.",
+        "Rust offers memory safety without garbage collection.",
+        "Julia targets high-performance numerical computing.",
+        "Go is designed for simple, concurrent network services.",
+    ]
+    query = "What language is good for data science?"
+
+    # --- 1. Build and persist the index (once per corpus) ---
+    index = build_ivf_index(embed_texts(documents), n_lists=2)
+    index.save("ivf_index")
+
+    # --- 2. Load it memory-mapped and retrieve-then-rerank ---
+    index = IVFIndex.load("ivf_index")
+    print(f"Reranking local candidates for: '{query}'")
+    for r in retrieve_and_rerank(query, documents, index, n_candidates=4, top_n=3, n_probe=2):
+        print(f"  [{r['score']:.4f}] {r['document']}")
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Together AI Evaluation Grid — Parallel Runs, Local Comparison (v2 SDK)
+
+Launch one classify or score evaluation per (model, judge, template)
+cell of a grid against a single uploaded dataset, track them all from
+one polling loop, and stream each finished `result_file_id` to disk.
+The per-row result files are then aggregated locally with numpy into a
+single comparison table: one row per cell, plus one per cell and slice
+when `slice_by` names a dataset column (e.g. "category"), so a model
+that only fails on one kind of input shows up directly.
+
+Workflow ids are saved to `out_dir/grid.json` as each evaluation is
+created; rerunning the same grid reattaches to those evaluations instead
+of launching new ones (cells whose create failed are retried), and
+result files already on disk are not downloaded again.
+
+The judge's per-row output column in result files is found by
+`outcome_field`, defaulting to the first of OUTCOME_FIELDS present.
+
+Usage:
+    python eval_grid.py
+
+Requires:
+    pip install together numpy
+    export TOGETHER_API_KEY=your_key
+"""
+
+import asyncio
+import csv
+import itertools
+import json
+import os
+import random
+import time
+
+import numpy as np
+
+from _together_client import get_async_client
+
+TERMINAL_STATUSES = ("completed", "error", "user_error")
+OUTCOME_FIELDS = {
+    "classify": ("label", "judge_label", "classification"),
+    "score": ("score", "judge_score"),
+}
+
+
+# --- 1. Build the grid ---
+def build_grid(
+    models: list[str | dict],
+    judges: list[str | dict],
+    templates: dict[str, str],
+    eval_type: str = "classify",
+    **criteria,
+) -> list[dict]:
+    """One evaluation per (model, judge, template).
+
+    `models` and `judges` are model names (serverless) or full model
+    configuration objects; `templates` maps a short name to a judge
+    system template. `criteria` are the type's remaining parameters:
+    `labels` and `pass_labels` for classify, `min_score`, `max_score`
+    and `pass_threshold` for score.
+    """
+    cells = []
+    for model, judge, (name, template) in itertools.product(models, judges, templates.items()):
+        if isinstance(model, str):
+            model = {"model": model, "model_source": "serverless", "input_template": "{{prompt}}"}
+        if isinstance(judge, str):
+            judge = {"model": judge, "model_source": "serverless"}
+        cells.append({
+            "key": f"{model['model']} | {judge['model']} | {name}",
+            "model": model["model"],
+            "judge": judge["model"],
+            "template": name,
+            "type": eval_type,
+            "parameters": {
+                "judge": dict(judge, system_template=template),
+                "model_to_evaluate": model,
+                **criteria,
+            },
+        })
+    return cells
+
+
+# --- 2. Launch, poll, and download ---
+def next_poll_delay(delay: float, min_delay: float = 5.0, max_delay: float = 120.0) -> float:
+    """Back off exponentially, with jitter so a large grid doesn't poll in lockstep."""
+    return min(max_delay, max(min_delay, delay * 1.5)) * random.uniform(0.8, 1.2)
+
+
+async def download_results(file_id: str, path: str) -> str:
+    """Stream a result file to `path` via a temp file and an atomic rename."""
+    part = f"{path}.part"
+    async with get_async_client().files.with_streaming_response.content(id=file_id) as response:
+        with open(part, "wb") as f:
+            async for chunk in response.iter_bytes():
+                f.write(chunk)
+    os.replace(part, path)
+    return path
+
+
+def _server_summary(results) -> dict:
+    if results is None:
+        return {}
+    summary = results.model_dump(exclude_none=True)
+    summary.update(summary.pop("aggregated_scores", {}))
+    if isinstance(summary.get("label_counts"), str):
+        summary["label_counts"] = json.loads(summary["label_counts"])
+    return summary
+
+
+async def run_grid(
+    cells: list[dict],
+    dataset_path: str,
+    out_dir: str,
+    max_creates: int = 8,
+    min_delay: float = 5.0,
+    max_delay: float = 120.0,
+    timeout: float = 4 * 3600.0,
+) -> list[dict]:
+    """Run every cell and download its result file into `out_dir`.
+
+    Each cell gains `workflow_id`, `status`, `server` (the summary the
+    API reports) and `result_path` (None if the evaluation failed).
+    Cells whose create call fails get status "create_failed"; cells
+    still unfinished after `timeout` seconds get status "timeout".
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    grid_path = os.path.join(out_dir, "grid.json")
+    known = {}
+    if os.path.exists(grid_path):
+        with open(grid_path) as f:
+            known = {cell["key"]: cell["workflow_id"] for cell in json.load(f)}
+
+    def save_known():
+        tmp = f"{grid_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump([{"key": k, "workflow_id": w} for k, w in known.items()], f, indent=2)
+        os.replace(tmp, grid_path)
+
+    client = get_async_client()
+    pending = [cell for cell in cells if cell["key"] not in known]
+    launched = 0
+    if pending:
+        uploaded = await client.files.upload(file=dataset_path, purpose="eval")
+        print(f"Uploaded dataset: {uploaded.id}")
+        slots = asyncio.Semaphore(max_creates)
+
+        async def create(cell: dict):
+            parameters = dict(cell["parameters"], input_data_file_path=uploaded.id)
+            async with slots:
+                evaluation = await client.evals.create(type=cell["type"], parameters=parameters)
+            # Save right away: a later failure must not lose an evaluation that is already running.
+            known[cell["key"]] = evaluation.workflow_id
+            save_known()
+
+        outcomes = await asyncio.gather(*(create(c) for c in pending), return_exceptions=True)
+        launched = sum(not isinstance(outcome, BaseException) for outcome in outcomes)
+        for cell, outcome in zip(pending, outcomes):
+            if isinstance(outcome, BaseException):
+                cell.update(workflow_id=None, status="create_failed", server={"error": str(outcome)}, result_path=None)
+                print(f"  {cell['key']}: create failed: {outcome}")
+    tracked = [i for i, cell in enumerate(cells) if cell["key"] in known]
+    for i in tracked:
+        cells[i]["workflow_id"] = known[cells[i]["key"]]
+    print(f"Tracking {len(tracked)} evaluation(s), {launched} newly launched")
+
+    now = time.monotonic()
+    deadline = now + timeout
+    due = {i: (now, min_delay) for i in tracked}  # cell index -> (next poll, delay)
+    downloads = []
+    while due:
+        if time.monotonic() > deadline:
+            for i in due:
+                cells[i].update(status="timeout", server={}, result_path=None)
+                print(f"  {cells[i]['key']}: not finished within {timeout:.0f}s")
+            break
+        wake = min(min(at for at, _ in due.values()), deadline)
+        await asyncio.sleep(max(0.0, wake - time.monotonic()))
+        now = time.monotonic()
+        ready = [i for i, (at, _) in due.items() if at <= now]
+        statuses = await asyncio.gather(
+            *(client.evals.status(cells[i]["workflow_id"]) for i in ready), return_exceptions=True
+        )
+        for i, status in zip(ready, statuses):
+            cell = cells[i]
+            if isinstance(status, BaseException) or status.status not in TERMINAL_STATUSES:
+                delay = next_poll_delay(due[i][1], min_delay, max_delay)
+                due[i] = (now + delay, delay)
+                continue
+            del due[i]
+            cell["status"] = status.status
+            cell["server"] = _server_summary(status.results)
+            cell["result_path"] = None
+            file_id = cell["server"].get("result_file_id")
+            print(f"  {cell['key']}: {status.status}")
+            if status.status == "completed" and file_id:
+                cell["result_path"] = os.path.join(out_dir, f"{cell['workflow_id']}.jsonl")
+                if not os.path.exists(cell["result_path"]):
+                    downloads.append(asyncio.create_task(download_results(file_id, cell["result_path"])))
+    await asyncio.gather(*downloads)
+    return cells
+
+
+# --- 3. Aggregate locally ---
+def _find_field(path: str, candidates: tuple[str, ...]) -> str:
+    with open(path) as f:
+        first = json.loads(next(line for line in f if line.strip()))
+    field = next((c for c in candidates if c in first), None)
+    if field is None:
+        raise KeyError(f"none of {candidates} in {path}; pass outcome_field= (columns: {sorted(first)})")
+    return field
+
+
+def load_rows(cells: list[dict], slice_by: str | None = None, outcome_field: str | None = None):
+    """Flatten every cell's result file into (cell index, slice value, outcome) columns."""
+    cell_index, slices, outcomes = [], [], []
+    for i, cell in enumerate(cells):
+        path = cell.get("result_path")
+        if not path:
+            continue
+        field = outcome_field or _find_field(path, OUTCOME_FIELDS[cell["type"]])
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    cell_index.append(i)
+                    slices.append(str(row.get(slice_by, "")) if slice_by else "")
+                    outcomes.append(row.get(field))
+    return np.array(cell_index, dtype=np.int64), np.array(slices, dtype=object), outcomes
+
+
+def _group_metrics(group: np.ndarray, n_groups: int, eval_type: str, values: np.ndarray, criteria: dict) -> dict:
+    """Per-group metrics from flat arrays with one bincount per statistic."""
+    n = np.bincount(group, minlength=n_groups)
+    if eval_type == "classify":
+        labels = criteria["labels"]
+        valid = values >= 0
+        counts = np.bincount(
+            group[valid] * len(labels) + values[valid], minlength=n_groups * len(labels)
+        ).reshape(n_groups, len(labels))
+        pass_index = [labels.index(label) for label in criteria["pass_labels"]]
+        judged = counts.sum(axis=1)
+        passed = counts[:, pass_index].sum(axis=1)
+        metrics = {f"label:{label}": counts[:, j] for j, label in enumerate(labels)}
+    else:
+        valid = ~np.isnan(values)
+        scores = np.where(valid, values, 0.0)
+        judged = np.bincount(group[valid], minlength=n_groups)
+        total = np.bincount(group, weights=scores, minlength=n_groups)
+        squares = np.bincount(group, weights=scores * scores, minlength=n_groups)
+        passed = np.bincount(group[valid & (scores >= criteria["pass_threshold"])], minlength=n_groups)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = total / judged
+            metrics = {"mean_score": mean, "std_score": np.sqrt(np.maximum(squares / judged - mean**2, 0.0))}
+    with np.errstate(invalid="ignore", divide="ignore"):
+        metrics["pass_percentage"] = 100.0 * passed / judged
+    return dict(n=n, invalid=n - judged, **metrics)
+
+
+def _encode_outcomes(outcomes: list, eval_type: str, criteria: dict) -> np.ndarray:
+    if eval_type == "classify":
+        index = {label.strip().lower(): j for j, label in enumerate(criteria["labels"])}
+        return np.array([index.get(str(o).strip().lower(), -1) for o in outcomes], dtype=np.int64)
+    values = np.empty(len(outcomes))
+    for j, o in enumerate(outcomes):
+        try:
+            values[j] = float(o)
+        except (TypeError, ValueError):
+            values[j] = np.nan
+    return values
+
+
+def compare(cells: list[dict], slice_by: str | None = None, outcome_field: str | None = None) -> list[dict]:
+    """One comparison row per cell (slice "*") and, with `slice_by`, per cell and slice.
+
+    All cells must share one evaluation type and criteria. Pass
+    percentages are over rows the judge labelled or scored validly.
+    """
+    eval_type = cells[0]["type"]
+    criteria = cells[0]["parameters"]
+    cell_index, slices, outcomes = load_rows(cells, slice_by, outcome_field)
+    if not len(cell_index):
+        return []
+    values = _encode_outcomes(outcomes, eval_type, criteria)
+    slice_names, slice_index = np.unique(slices, return_inverse=True)
+
+    overall = _group_metrics(cell_index, len(cells), eval_type, values, criteria)
+    groups = [(i, "*", overall, i) for i in range(len(cells))]
+    if slice_by:
+        per_slice = _group_metrics(
+            cell_index * len(slice_names) + slice_index, len(cells) * len(slice_names), eval_type, values, criteria
+        )
+        groups += [(i, name, per_slice, i * len(slice_names) + s)
+                   for i in range(len(cells)) for s, name in enumerate(slice_names)]
+
+    rows = []
+    for i, slice_name, metrics, g in groups:
+        cell = cells[i]
+        if metrics["n"][g] == 0:
+            continue
+        row = {"model": cell["model"], "judge": cell["judge"], "template": cell["template"], "slice": slice_name}
+        for name, column in metrics.items():
+            value = column[g].item()
+            row[name] = round(value, 2) if isinstance(value, float) else value
+        if slice_name == "*":
+            row["server_pass_percentage"] = cell.get("server", {}).get("pass_percentage")
+        rows.append(row)
+    rows.sort(key=lambda r: (r["slice"] != "*", r["slice"], -np.nan_to_num(r["pass_percentage"], nan=-1.0)))
+    return rows
+
+
+def format_table(rows: list[dict]) -> str:
+    columns = list(dict.fromkeys(k for row in rows for k in row))
+    cells = [[str(row.get(c, "")) for c in columns] for row in rows]
+    widths = [max(len(c), *(len(r[j]) for r in cells)) for j, c in enumerate(columns)]
+    lines = ["  ".join(c.ljust(w) for c, w in zip(columns, widths))]
+    lines += ["  ".join(v.ljust(w) for v, w in zip(r, widths)) for r in cells]
+    return "\n".join(lines)
+
+
+def save_csv(rows: list[dict], path: str):
+    columns = list(dict.fromkeys(k for row in rows for k in row))
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    dataset = [
+        {"prompt": "The product arrived on time and works perfectly!", "category": "shipping"},
+        {"prompt": "Terrible experience. The item was broken.", "category": "quality"},
+        {"prompt": "It's okay, nothing special.", "category": "quality"},
+        {"prompt": "Delivery took three weeks and nobody answered my emails.", "category": "shipping"},
+    ]
+    os.makedirs("eval_grid", exist_ok=True)
+    data_path = os.path.join("eval_grid", "dataset.jsonl")
+    with open(data_path, "w") as f:
+        for row in dataset:
+            f.write(json.dumps(row) + "\n")
+
+    grid = build_grid(
+        models=["meta-llama/Meta-Llama-3.1-8B-Instruct-Turbo", "Qwen/Qwen2.5-72B-Instruct-Turbo"],
+        judges=["meta-llama/Llama-3.3-70B-Instruct-Turbo", "Qwen/Qwen2.5-72B-Instruct-Turbo"],
+        templates={
+            "terse": "Classify the sentiment of the response as positive, negative, or neutral.",
+            "empathetic": "Classify whether the response addresses the customer's concern with a positive, "
+                          "negative, or neutral tone.",
+        },
+        labels=["positive", "negative", "neutral"],
+        pass_labels=["positive"],
+    )
+    finished = asyncio.run(run_grid(grid, data_path, "eval_grid"))
+    table = compare(finished, slice_by="category")
+    save_csv(table, os.path.join("eval_grid", "comparison.csv"))
+    print(format_table(table))
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Together AI Evaluations — Local Judge Replay (v2 SDK)
+
+Replay an evaluation dataset against a judge on this machine instead of
+running a server-side evaluation, so edits to `system_template`,
+`labels` or score thresholds can be checked in seconds. Takes the same
+`type` and `parameters` as `client.evals.create` and returns the same
+results model: `label_counts`/`pass_percentage` for classify,
+`aggregated_scores` for score, `A_wins`/`B_wins`/`Ties` for compare.
+
+Judges and models are plain callables `(system, prompt) -> str`:
+`together_chat(model)` for a Together model, or any local function (a
+stub, a keyword rule, a local model server). Rows run concurrently on a
+thread pool, and every call goes through a `CallCache` keyed by
+(callable, system, prompt), so rerunning after a template edit only
+pays for the calls the edit changed. A callable's cache identity is its
+`cache_id` attribute, else its qualified name plus a fingerprint of its
+code, so editing a stub judge invalidates its cached outputs. Set
+`cache_id` when behaviour also depends on closures or defaults.
+
+The answer-format instructions appended to the judge prompt and the
+parsing of its reply are this script's own, so treat local numbers as
+a fast approximation and confirm the final template with a real
+evaluation (run_evaluation.py).
+
+Usage:
+    python judge_replay.py dataset.jsonl [out.jsonl]   # run_evaluation.py's classify parameters
+
+Requires:
+    pip install together
+    pip install jinja2  # optional: full Jinja2 templates (else {{field}} substitution only)
+    export TOGETHER_API_KEY=your_key
+"""
+
+import functools
+import hashlib
+import json
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+from together.types.evaluation_job import (
+    ResultsEvaluationClassifyResults,
+    ResultsEvaluationCompareResults,
+    ResultsEvaluationScoreResults,
+)
+
+from _together_client import get_client
+
+Chat = Callable[[str, str], str]
+
+
+def together_chat(model: str, temperature: float = 0.0, max_tokens: int = 512, **options) -> Chat:
+    """A `(system, prompt) -> str` callable backed by a Together chat model."""
+
+    def chat(system: str, prompt: str) -> str:
+        messages = [{"role": "system", "content": system}] if system else []
+        response = get_client().chat.completions.create(
+            model=model,
+            messages=messages + [{"role": "user", "content": prompt}],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **options,
+        )
+        return response.choices[0].message.content or ""
+
+    chat.cache_id = json.dumps(["together", model, temperature, max_tokens, options], sort_keys=True)
+    return chat
+
+
+def _code_fingerprint(code) -> str:
+    """Hash of a code object's bytecode, constants and names (nested functions included)."""
+    digest = hashlib.sha256(code.co_code)
+    for const in code.co_consts:
+        # A nested code object's repr contains its address, so hash its contents instead.
+        digest.update((_code_fingerprint(const) if hasattr(const, "co_code") else repr(const)).encode("utf-8"))
+    digest.update(repr(code.co_names).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def cache_identity(fn: Chat) -> str:
+    """`fn.cache_id`, else its qualified name plus a fingerprint of its code."""
+    if getattr(fn, "cache_id", None):
+        return fn.cache_id
+    code = getattr(fn, "__code__", None) or getattr(getattr(fn, "__call__", None), "__code__", None)
+    name = f"{getattr(fn, '__module__', '')}.{getattr(fn, '__qualname__', type(fn).__qualname__)}"
+    return f"{name}:{_code_fingerprint(code)}" if code else name
+
+
+class CallCache:
+    """SQLite cache of chat-callable outputs keyed by (callable, system, prompt).
+
+    Concurrent calls with the same key are coalesced: one thread calls
+    `fn`, the others wait for its output.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS calls (key TEXT PRIMARY KEY, output TEXT NOT NULL)")
+        self._lock = threading.Lock()
+        self._in_flight: dict[str, Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def call(self, fn: Chat, system: str, prompt: str) -> str:
+        key = hashlib.sha256(json.dumps([cache_identity(fn), system, prompt]).encode("utf-8")).hexdigest()
+        with self._lock:
+            row = self._db.execute("SELECT output FROM calls WHERE key = ?", (key,)).fetchone()
+            if row:
+                self.hits += 1
+                return row[0]
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not owner:
+            return future.result()
+
+        try:
+            output = fn(system, prompt)
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self.misses += 1
+            self._db.execute("INSERT OR REPLACE INTO calls VALUES (?, ?)", (key, output))
+            self._db.commit()
+            del self._in_flight[key]
+        future.set_result(output)
+        return output
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced}
+
+
+# --- Templates ---
+@functools.lru_cache(maxsize=1)
+def _jinja():
+    try:
+        import jinja2
+    except ImportError:
+        return None
+    return jinja2.Environment()
+
+
+@functools.lru_cache(maxsize=64)
+def _compile(template: str):
+    return _jinja().from_string(template)
+
+
+def _lookup(row: dict, path: str):
+    value = row
+    for part in path.split("."):
+        value = value.get(part, "") if isinstance(value, dict) else ""
+    return value
+
+
+def render(template: str, row: dict) -> str:
+    """Render a Jinja2 template with a dataset row; without jinja2, only `{{field}}` and `{{a.b}}` are substituted."""
+    if _jinja() is None:
+        return re.sub(r"\{\{\s*([\w.]+)\s*\}\}", lambda m: str(_lookup(row, m.group(1))), template)
+    return _compile(template).render(**row)
+
+
+# --- Parsing judge replies ---
+def parse_label(output: str, labels: list[str]) -> str | None:
+    """The label the judge answered: an exact match, else the label mentioned first."""
+    answer = output.strip().strip(".\"'*` ").lower()
+    for label in labels:
+        if answer == label.lower():
+            return label
+    found = []
+    for label in labels:
+        # Treat "-" as part of a word so "Toxic" doesn't match inside "Non-toxic".
+        match = re.search(rf"(?<![\w-]){re.escape(label)}(?![\w-])", output, re.IGNORECASE)
+        if match:
+            found.append((match.start(), -len(label), label))
+    return min(found)[2] if found else None
+
+
+def parse_score(output: str, min_score: float, max_score: float) -> float | None:
+    match = re.search(r"-?\d+(?:\.\d+)?", output)
+    score = float(match.group()) if match else None
+    return score if score is not None and min_score <= score <= max_score else None
+
+
+def parse_winner(output: str) -> str | None:
+    match = re.search(r"\b(A|B)\b|\b((?i:tie))\b", output)
+    if not match:
+        return None
+    return "Tie" if match.group(2) else match.group(1).upper()
+
+
+# --- Replay ---
+def _responder(spec: str | dict, override: Chat | None, cache: CallCache) -> Callable[[dict], str]:
+    """Response for one row: a dataset column (pre-generated), or a model config run via `override` or Together."""
+    if isinstance(spec, str):
+        return lambda row: str(row[spec])
+    chat = override or together_chat(
+        spec["model"], **{k: spec[k] for k in ("temperature", "max_tokens") if k in spec}
+    )
+    return lambda row: cache.call(chat, render(spec.get("system_template", ""), row), render(spec["input_template"], row))
+
+
+def _instructions(eval_type: str, parameters: dict) -> str:
+    if eval_type == "classify":
+        return f"\n\nAnswer with exactly one of these labels: {', '.join(parameters['labels'])}."
+    if eval_type == "score":
+        return f"\n\nAnswer with a single number from {parameters['min_score']:g} to {parameters['max_score']:g}."
+    return "\n\nAnswer with A if Response A is better, B if Response B is better, or Tie."
+
+
+def replay_row(
+    row: dict,
+    eval_type: str,
+    parameters: dict,
+    judge: Chat,
+    responders: dict[str, Callable[[dict], str]],
+    cache: CallCache,
+) -> dict:
+    """Generate (if needed) and judge one row; returns the row plus judge outputs."""
+    record = dict(row)
+    try:
+        responses = {name: respond(row) for name, respond in responders.items()}
+    except Exception as e:
+        record["generation_error"] = str(e)
+        return record
+
+    context = {**parameters, **row}
+    system = render(parameters["judge"]["system_template"], context) + _instructions(eval_type, parameters)
+    try:
+        if eval_type == "compare":
+            a, b = responses["model_a"], responses["model_b"]
+            output = cache.call(judge, system, f"Response A:\n{a}\n\nResponse B:\n{b}")
+            winner = parse_winner(output)
+            if not parameters.get("disable_position_bias_correction"):
+                # Second pass with the responses swapped; the passes must agree or it's a tie.
+                flipped = parse_winner(cache.call(judge, system, f"Response A:\n{b}\n\nResponse B:\n{a}"))
+                flipped = {"A": "B", "B": "A"}.get(flipped, flipped)
+                winner = None if winner is None or flipped is None else winner if winner == flipped else "Tie"
+            record.update(response_a=a, response_b=b, judge_output=output, winner=winner)
+        else:
+            response = responses["model_to_evaluate"]
+            output = cache.call(judge, system, response)
+            record.update(response=response, judge_output=output)
+            if eval_type == "classify":
+                record["label"] = parse_label(output, parameters["labels"])
+            else:
+                record["score"] = parse_score(output, parameters["min_score"], parameters["max_score"])
+    except Exception as e:
+        record["judge_error"] = str(e)
+    return record
+
+
+def summarize(records: list[dict], eval_type: str, parameters: dict):
+    """Aggregate replayed rows into the results model a server-side evaluation returns."""
+    generation_fails = sum("generation_error" in r for r in records)
+    judge_fails = sum("judge_error" in r for r in records)
+    judged = [r for r in records if "judge_output" in r]
+
+    if eval_type == "classify":
+        labels = [r["label"] for r in judged if r["label"] is not None]
+        passed = sum(label in parameters["pass_labels"] for label in labels)
+        return ResultsEvaluationClassifyResults(
+            label_counts=json.dumps(Counter(labels)),
+            pass_percentage=100.0 * passed / len(labels) if labels else 0.0,
+            invalid_label_count=len(judged) - len(labels),
+            judge_fail_count=judge_fails,
+            generation_fail_count=generation_fails,
+        )
+    if eval_type == "score":
+        scores = [r["score"] for r in judged if r["score"] is not None]
+        mean = sum(scores) / len(scores) if scores else 0.0
+        std = (sum((s - mean) ** 2 for s in scores) / len(scores)) ** 0.5 if scores else 0.0
+        passed = sum(s >= parameters["pass_threshold"] for s in scores)
+        return ResultsEvaluationScoreResults.model_validate({
+            "aggregated_scores": {
+                "mean_score": mean,
+                "std_score": std,
+                "pass_percentage": 100.0 * passed / len(scores) if scores else 0.0,
+            },
+            "invalid_score_count": len(judged) - len(scores),
+            "judge_fail_count": judge_fails,
+            "generation_fail_count": generation_fails,
+        })
+    winners = Counter(r["winner"] for r in judged)
+    return ResultsEvaluationCompareResults.model_validate({
+        "A_wins": winners["A"],
+        "B_wins": winners["B"],
+        "Ties": winners["Tie"],
+        # Unparseable verdicts count as judge failures; compare results have no invalid count.
+        "judge_fail_count": judge_fails + winners[None],
+        "generation_fail_count": generation_fails,
+    })
+
+
+def replay_evaluation(
+    eval_type: str,
+    parameters: dict,
+    dataset_path: str,
+    judge: Chat | None = None,
+    models: dict[str, Chat] | None = None,
+    cache: CallCache | None = None,
+    max_workers: int = 16,
+    out_path: str | None = None,
+):
+    """Run a classify/score/compare evaluation locally and return its results model.
+
+    `parameters` is what `client.evals.create` takes (`input_data_file_path`
+    is ignored). `judge` defaults to the configured judge model on
+    Together; `models` optionally replaces the model configs
+    ("model_to_evaluate", "model_a", "model_b") with local callables.
+    With `out_path`, per-row records (row, responses, `judge_output` and
+    `label`/`score`/`winner`) are written as JSONL.
+    """
+    cache = cache or CallCache()
+    models = models or {}
+    judge = judge or together_chat(parameters["judge"]["model"])
+    names = ("model_a", "model_b") if eval_type == "compare" else ("model_to_evaluate",)
+    responders = {name: _responder(parameters[name], models.get(name), cache) for name in names}
+
+    with open(dataset_path) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers) as pool:
+        records = list(pool.map(
+            lambda row: replay_row(row, eval_type, parameters, judge, responders, cache), rows
+        ))
+    elapsed = time.perf_counter() - started
+
+    if out_path:
+        with open(out_path, "w") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    print(f"Replayed {len(rows)} rows in {elapsed:.2f}s; cache: {cache.stats()}")
+    return summarize(records, eval_type, parameters)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python judge_replay.py <dataset.jsonl> [out.jsonl]")
+        sys.exit(1)
+
+    from run_evaluation import classify_parameters
+
+    parameters = classify_parameters(input_data_file_path=sys.argv[1])
+    results = replay_evaluation("classify", parameters, sys.argv[1], out_path=sys.argv[2] if len(sys.argv) > 2 else None)
+    print(f"  Label counts: {results.label_counts}")
+    print(f"  Pass percentage: {results.pass_percentage:.1f}%")
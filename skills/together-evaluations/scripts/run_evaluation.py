@@ -2,10 +2,14 @@
 """
 Together AI Evaluations — Run Classify/Score/Compare (v2 SDK)
 
-Upload a dataset, create an evaluation, and poll for results.
+Upload a dataset, create an evaluation, and poll for results. With
+--local, replay the same dataset and parameters against the judge model
+on this machine instead (judge_replay.py), which is much faster for
+iterating on `system_template` and `labels`.
 
 Usage:
     python run_evaluation.py
+    python run_evaluation.py --local
 
 Requires:
     pip install together
@@ -13,61 +17,68 @@ Requires:
 """
 
 import json
+import sys
 import time
 import tempfile
-from together import Together
 from together.types.eval_create_params import (
     ParametersEvaluationClassifyParameters,
     ParametersEvaluationClassifyParametersJudge,
 )
 
-client = Together()
+from _together_client import get_client
 
+DATASET = [
+    {"prompt": "The product arrived on time and works perfectly!", "expected": "positive"},
+    {"prompt": "Terrible experience. The item was broken.", "expected": "negative"},
+    {"prompt": "It's okay, nothing special.", "expected": "neutral"},
+]
 
-def run_classify_evaluation():
-    """Run a classify evaluation (e.g., sentiment, quality)."""
-
-    # --- 1. Prepare evaluation dataset ---
-    dataset = [
-        {"prompt": "The product arrived on time and works perfectly!", "expected": "positive"},
-        {"prompt": "Terrible experience. The item was broken.", "expected": "negative"},
-        {"prompt": "It's okay, nothing special.", "expected": "neutral"},
-    ]
 
+def write_dataset() -> str:
     data_path = tempfile.mktemp(suffix=".jsonl")
     with open(data_path, "w") as f:
-        for row in dataset:
+        for row in DATASET:
             f.write(json.dumps(row) + "\n")
+    return data_path
+
+
+def classify_parameters(input_data_file_path: str) -> ParametersEvaluationClassifyParameters:
+    """Sentiment classify parameters, shared by the server-side and local runs."""
+    return ParametersEvaluationClassifyParameters(
+        judge=ParametersEvaluationClassifyParametersJudge(
+            model="meta-llama/Llama-3.3-70B-Instruct-Turbo",
+            model_source="serverless",
+            system_template="Classify the following text as positive, negative, or neutral sentiment.",
+        ),
+        input_data_file_path=input_data_file_path,
+        labels=["positive", "negative", "neutral"],
+        pass_labels=["positive"],
+        model_to_evaluate={
+            "model": "meta-llama/Meta-Llama-3.1-8B-Instruct-Turbo",
+            "model_source": "serverless",
+            "input_template": "{{prompt}}",
+        },
+    )
+
+
+def run_classify_evaluation():
+    """Run a classify evaluation (e.g., sentiment, quality)."""
+
+    # --- 1. Prepare evaluation dataset ---
+    data_path = write_dataset()
 
     # --- 2. Upload dataset ---
-    file_response = client.files.upload(file=data_path, purpose="eval")
+    file_response = get_client().files.upload(file=data_path, purpose="eval")
     file_id = file_response.id
     print(f"Uploaded dataset: {file_id}")
 
     # --- 3. Create evaluation ---
-    evaluation = client.evals.create(
-        type="classify",
-        parameters=ParametersEvaluationClassifyParameters(
-            judge=ParametersEvaluationClassifyParametersJudge(
-                model="meta-llama/Llama-3.3-70B-Instruct-Turbo",
-                model_source="serverless",
-                system_template="Classify the following text as positive, negative, or neutral sentiment.",
-            ),
-            input_data_file_path=file_id,
-            labels=["positive", "negative", "neutral"],
-            pass_labels=["positive"],
-            model_to_evaluate={
-                "model": "meta-llama/Meta-Llama-3.1-8B-Instruct-Turbo",
-                "model_source": "serverless",
-                "input_template": "{{prompt}}",
-            },
-        ),
-    )
+    evaluation = get_client().evals.create(type="classify", parameters=classify_parameters(file_id))
     print(f"Created evaluation: {evaluation.workflow_id}")
 
     # --- 4. Poll for completion ---
     while True:
-        status = client.evals.retrieve(evaluation.workflow_id)
+        status = get_client().evals.retrieve(evaluation.workflow_id)
         current = status.status
         print(f"  Status: {current}")
 
@@ -80,7 +91,7 @@ def run_classify_evaluation():
         time.sleep(5)
 
     # --- 5. Get results ---
-    result = client.evals.retrieve(evaluation.workflow_id)
+    result = get_client().evals.retrieve(evaluation.workflow_id)
     print(f"\nResults:")
     if result.results:
         print(f"  Label counts: {result.results.label_counts}")
@@ -89,5 +100,19 @@ def run_classify_evaluation():
             print(f"  Full results file: {result.results.result_file_id}")
 
 
+def run_classify_locally():
+    """Replay the same classify evaluation locally (see judge_replay.py)."""
+    from judge_replay import replay_evaluation
+
+    data_path = write_dataset()
+    results = replay_evaluation("classify", classify_parameters(data_path), data_path)
+    print("\nLocal results:")
+    print(f"  Label counts: {results.label_counts}")
+    print(f"  Pass percentage: {results.pass_percentage:.1f}%")
+
+
 if __name__ == "__main__":
-    run_classify_evaluation()
+    if "--local" in sys.argv:
+        run_classify_locally()
+    else:
+        run_classify_evaluation()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Together AI Bulk Image Generation — Prompt Manifest to Disk (v2 SDK)
+
+Generate images for a JSONL prompt manifest with a bounded worker pool.
+Each response body is streamed and its base64 image is decoded
+incrementally straight into a temp file, then atomically renamed into
+place, so memory stays flat no matter how large the images or the job.
+Finished ids are appended to a done-set file; rerunning the same
+command skips them. Reports images/sec and peak RSS. With an
+`ImageStore` (image_store.py), seeded duplicates — within the run or
+from earlier runs — are rendered once and linked into place.
+
+Manifest lines: {"id": "sku-123", "prompt": "...", ...}. Any other keys
+(model, width, height, steps, seed, output_format, ...) override the
+defaults for that image; `id` defaults to the line number.
+
+Usage:
+    python bulk_generate.py prompts.jsonl out/ [--workers 16] [--store image_store/]
+
+Requires:
+    pip install together
+    export TOGETHER_API_KEY=your_key
+"""
+
+import binascii
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import BinaryIO, Iterator
+
+from _together_client import get_client
+from image_store import ImageStore
+
+DEFAULTS = {
+    "model": "black-forest-labs/FLUX.1-schnell",
+    "width": 1024,
+    "height": 1024,
+    "steps": 4,
+    "output_format": "png",
+}
+
+
+class Base64FieldDecoder:
+    """Decode the first `"b64_json"` string of a streamed JSON body straight into a file.
+
+    Only a few bytes of lookahead and an incomplete base64 quantum are
+    held between chunks; the rest goes to `out` as soon as it arrives.
+    """
+
+    MARKER = b'"b64_json"'
+
+    def __init__(self, out: BinaryIO):
+        self.out = out
+        self.state = "seek"  # seek -> value -> done
+        self.written = 0
+        self._carry = b""
+
+    def feed(self, chunk: bytes):
+        if self.state == "seek":
+            data = self._carry + chunk
+            start = data.find(self.MARKER)
+            quote = data.find(b'"', start + len(self.MARKER)) if start >= 0 else -1
+            if quote < 0:
+                # Keep enough to match a marker split across chunks.
+                self._carry = data[start:] if start >= 0 else data[-len(self.MARKER):]
+                return
+            if data[start + len(self.MARKER):quote].strip(b": \t\r\n"):
+                raise ValueError("b64_json is not a string")
+            self.state, self._carry, chunk = "value", b"", data[quote + 1:]
+        if self.state != "value":
+            return
+        end = chunk.find(b'"')
+        # Base64 has no backslashes; dropping them undoes JSON's optional "\/" escape.
+        data = self._carry + (chunk if end < 0 else chunk[:end]).replace(b"\\", b"")
+        usable = len(data) - len(data) % 4 if end < 0 else len(data)
+        if usable:
+            decoded = binascii.a2b_base64(data[:usable])
+            self.out.write(decoded)
+            self.written += len(decoded)
+        self._carry = data[usable:]
+        if end >= 0:
+            self.state = "done"
+
+    def close(self):
+        if self.state != "done":
+            raise ValueError("response did not contain a complete b64_json image")
+
+
+def generate_to_file(prompt: str, path: str, chunk_size: int = 64 * 1024, **params) -> int:
+    """Generate one image, streaming and decoding it into `path` via an atomic rename."""
+    tmp = f"{path}.tmp"
+    try:
+        with get_client().images.with_streaming_response.generate(
+            prompt=prompt,
+            n=1,
+            response_format="base64",
+            **params,
+        ) as response, open(tmp, "wb") as f:
+            decoder = Base64FieldDecoder(f)
+            for chunk in response.iter_bytes(chunk_size):
+                decoder.feed(chunk)
+            decoder.close()
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    os.replace(tmp, path)
+    return decoder.written
+
+
+def link_or_copy(source: str, path: str):
+    """Place `source` at `path` atomically, hard-linking when the filesystem allows."""
+    tmp = f"{path}.tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    try:
+        os.link(source, tmp)
+    except OSError:
+        shutil.copyfile(source, tmp)
+    os.replace(tmp, path)
+
+
+def iter_manifest(path: str) -> Iterator[dict]:
+    with open(path) as f:
+        for line_no, line in enumerate(f):
+            if line.strip():
+                entry = json.loads(line)
+                entry.setdefault("id", str(line_no))
+                yield entry
+
+
+def load_done(path: str) -> set[str]:
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return {line.rstrip("\n") for line in f if line.strip()}
+
+
+def peak_rss_mb() -> float | None:
+    """Peak resident set size of this process (ru_maxrss is KiB on Linux, bytes on macOS)."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def bulk_generate(
+    manifest_path: str,
+    out_dir: str,
+    max_workers: int = 16,
+    max_in_flight: int | None = None,
+    store: ImageStore | None = None,
+    **defaults,
+) -> dict:
+    """Generate every manifest entry not yet in `out_dir/done.txt`.
+
+    At most `max_in_flight` entries (default 2x workers) are read ahead,
+    so the manifest is streamed rather than loaded. Failures are
+    appended to `out_dir/failed.jsonl` and retried on the next run.
+    Seeded entries go through `store` when one is given.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    done_path = os.path.join(out_dir, "done.txt")
+    done = load_done(done_path)
+    params = {**DEFAULTS, **defaults}
+    max_in_flight = max_in_flight or 2 * max_workers
+    lock = threading.Lock()
+    counts = {"generated": 0, "skipped": 0, "failed": 0, "bytes": 0}
+
+    def run(entry: dict):
+        image_id = str(entry.pop("id"))
+        prompt = entry.pop("prompt")
+        options = {**params, **entry}
+        path = os.path.join(out_dir, f"{image_id}.{options['output_format']}")
+        try:
+            request = dict(options, prompt=prompt)
+            if store and store.cacheable(request):
+                link_or_copy(store.fetch(request, lambda p: generate_to_file(path=p, **request)), path)
+                size = os.path.getsize(path)
+            else:
+                size = generate_to_file(prompt, path, **options)
+        except Exception as e:
+            with lock, open(os.path.join(out_dir, "failed.jsonl"), "a") as f:
+                f.write(json.dumps({"id": image_id, "error": str(e)}) + "\n")
+                counts["failed"] += 1
+            return
+        with lock:
+            done_file.write(image_id + "\n")
+            done_file.flush()
+            counts["generated"] += 1
+            counts["bytes"] += size
+
+    started = time.perf_counter()
+    with open(done_path, "a") as done_file, ThreadPoolExecutor(max_workers) as pool:
+        in_flight = set()
+        for entry in iter_manifest(manifest_path):
+            if str(entry["id"]) in done:
+                counts["skipped"] += 1
+                continue
+            if len(in_flight) >= max_in_flight:
+                _, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            in_flight.add(pool.submit(run, entry))
+        wait(in_flight)
+
+    elapsed = time.perf_counter() - started
+    report = dict(
+        counts,
+        seconds=round(elapsed, 1),
+        images_per_sec=round(counts["generated"] / elapsed, 2) if elapsed else 0.0,
+        peak_rss_mb=peak_rss_mb(),
+    )
+    if store:
+        report["store"] = store.stats()
+    print(f"Bulk generation: {report}")
+    return report
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python bulk_generate.py <prompts.jsonl> <out_dir> [--workers N] [--store DIR]")
+        sys.exit(1)
+
+    flags = sys.argv[3:]
+    workers = int(flags[flags.index("--workers") + 1]) if "--workers" in flags else 16
+    store = ImageStore(flags[flags.index("--store") + 1]) if "--store" in flags else None
+    bulk_generate(sys.argv[1], sys.argv[2], max_workers=workers, store=store)
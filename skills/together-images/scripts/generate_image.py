@@ -3,7 +3,8 @@
 Together AI Image Generation — Generate, Save, and Edit Images (v2 SDK)
 
 Text-to-image generation with FLUX models, including base64 saving,
-multiple variations, and image-to-image editing.
+multiple variations, and image-to-image editing. Seeded renders can go
+through an `ImageStore` (image_store.py) so repeats are local file reads.
 
 Usage:
     python generate_image.py
@@ -14,9 +15,11 @@ Requires:
 """
 
 import base64
-from together import Together
-
-client = Together()
+import os
+import shutil
+from _together_client import get_client
+from bulk_generate import generate_to_file
+from image_store import ImageStore
 
 
 def generate_image_url(
@@ -27,8 +30,13 @@ def generate_image_url(
     steps: int = 4,
     n: int = 1,
     seed: int | None = None,
+    store: ImageStore | None = None,
 ) -> list[str]:
-    """Generate image(s) and return URL(s)."""
+    """Generate image(s) and return URL(s).
+
+    With a `store` and a seed, each image is rendered into the store
+    once and `file://` URLs of the stored copies are returned.
+    """
     kwargs = dict(
         model=model,
         prompt=prompt,
@@ -40,7 +48,18 @@ def generate_image_url(
     if seed is not None:
         kwargs["seed"] = seed
 
-    response = client.images.generate(**kwargs)
+    if store and store.cacheable(kwargs):
+        urls = []
+        for i in range(n):
+            # One image per request; the variation index keeps variations apart in the store.
+            params = dict(kwargs, seed=seed + i, output_format="png")
+            params.pop("n")
+            path = store.fetch(params, lambda p, params=params: generate_to_file(path=p, **params))
+            urls.append(f"file://{os.path.abspath(path)}")
+            print(f"  Image {i}: {urls[-1]}")
+        return urls
+
+    response = get_client().images.generate(**kwargs)
     urls = [img.url for img in response.data]
     for i, url in enumerate(urls):
         print(f"  Image {i}: {url}")
@@ -55,8 +74,13 @@ def generate_and_save(
     height: int = 1024,
     steps: int = 4,
     seed: int | None = None,
+    store: ImageStore | None = None,
 ) -> str:
-    """Generate an image and save it locally via base64."""
+    """Generate an image and save it locally via base64.
+
+    With a `store` and a seed, a previously rendered image is copied
+    from the store instead of being generated again.
+    """
     kwargs = dict(
         model=model,
         prompt=prompt,
@@ -69,7 +93,16 @@ def generate_and_save(
     if seed is not None:
         kwargs["seed"] = seed
 
-    response = client.images.generate(**kwargs)
+    if store and store.cacheable(kwargs):
+        params = dict(kwargs, output_format="png")
+        # generate_to_file sets n and response_format itself.
+        params.pop("n")
+        params.pop("response_format")
+        shutil.copyfile(store.fetch(params, lambda p: generate_to_file(path=p, **params)), output_path)
+        print(f"  Saved to {output_path} (store: {store.stats()})")
+        return output_path
+
+    response = get_client().images.generate(**kwargs)
     image_data = base64.b64decode(response.data[0].b64_json)
 
     with open(output_path, "wb") as f:
@@ -87,7 +120,7 @@ def edit_image(
     height: int = 1024,
 ) -> str:
     """Edit an existing image using a text prompt (image-to-image)."""
-    response = client.images.generate(
+    response = get_client().images.generate(
         model=model,
         prompt=prompt,
         image_url=image_url,
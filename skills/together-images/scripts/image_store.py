@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Together AI Image Store — Content-Addressed Cache for Seeded Renders (v2 SDK)
+
+Seeded FLUX generations are deterministic, so an image can be stored
+under a hash of its full request (model, prompt, width, height, steps,
+seed, output format, ...) and every repeat becomes a local file read.
+Concurrent requests for the same key are coalesced: one thread renders,
+the others wait for its result instead of rendering a duplicate.
+Unseeded requests are never cached.
+
+Used by generate_image.py (`store=`) and bulk_generate.py (`store=`).
+
+Usage:
+    python image_store.py [store_dir]     # print store size
+
+Requires:
+    pip install together
+    export TOGETHER_API_KEY=your_key
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+from concurrent.futures import Future
+from typing import Callable
+
+# Request fields that don't change the pixels.
+NON_KEY_FIELDS = ("response_format",)
+
+
+class ImageStore:
+    """On-disk images addressed by sha256 of their normalized request parameters.
+
+    Files live at `root/<key[:2]>/<key>.<output_format>`. `render(path)`
+    must create `path` atomically (write a temp file, then rename), as
+    `bulk_generate.generate_to_file` does.
+    """
+
+    def __init__(self, root: str = "image_store"):
+        self.root = root
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._in_flight: dict[str, Future] = {}
+
+    @staticmethod
+    def cacheable(params: dict) -> bool:
+        return params.get("seed") is not None
+
+    @staticmethod
+    def key(params: dict) -> str:
+        fields = {k: v for k, v in params.items() if k not in NON_KEY_FIELDS and v is not None}
+        encoded = json.dumps(fields, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def path(self, params: dict) -> str:
+        key = self.key(params)
+        return os.path.join(self.root, key[:2], f"{key}.{params.get('output_format', 'png')}")
+
+    def fetch(self, params: dict, render: Callable[[str], object]) -> str:
+        """Return the stored image for `params`, rendering it once if it is missing."""
+        path = self.path(params)
+        if os.path.exists(path):
+            with self._lock:
+                self.hits += 1
+            return path
+
+        with self._lock:
+            future = self._in_flight.get(path)
+            owner = future is None
+            if owner:
+                future = self._in_flight[path] = Future()
+            else:
+                self.coalesced += 1
+        if not owner:
+            return future.result()
+
+        try:
+            if not os.path.exists(path):  # another owner may have finished since the first check
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                render(path)
+                with self._lock:
+                    self.misses += 1
+            future.set_result(path)
+            return path
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[path]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced}
+
+
+def store_size(root: str) -> tuple[int, int]:
+    """(image count, total bytes) under `root`."""
+    count = total = 0
+    for directory, _, files in os.walk(root):
+        for name in files:
+            if not name.endswith(".tmp"):
+                count += 1
+                total += os.path.getsize(os.path.join(directory, name))
+    return count, total
+
+
+if __name__ == "__main__":
+    root = sys.argv[1] if len(sys.argv) > 1 else "image_store"
+    count, total = store_size(root)
+    print(f"{root}: {count} images, {total / 1e6:.1f} MB")
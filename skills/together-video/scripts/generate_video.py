@@ -3,25 +3,27 @@
 Together AI Video Generation — Async Workflow (v2 SDK)
 
 Submit a video job, poll for completion, and download the result.
-Supports text-to-video and image-to-video (keyframes).
+Supports text-to-video and image-to-video (keyframes). For many jobs at
+once, use video_jobs.py, which polls them all from one loop.
 
 Usage:
     python generate_video.py
 
 Requires:
-    pip install together requests
+    pip install together
     export TOGETHER_API_KEY=your_key
 """
 
+import asyncio
 import time
-from together import Together
 
-client = Together()
+from _together_client import get_client
+from video_jobs import download_video
 
 
 def generate_text_to_video():
     """Generate a video from a text prompt."""
-    job = client.videos.create(
+    job = get_client().videos.create(
         prompt="A serene sunset over the ocean with gentle waves lapping at the shore",
         model="google/veo-3.0",
         width=1920,
@@ -33,7 +35,7 @@ def generate_text_to_video():
 
 def generate_image_to_video(image_base64: str):
     """Generate a video from a starting image (keyframe)."""
-    job = client.videos.create(
+    job = get_client().videos.create(
         prompt="Smooth camera zoom out revealing a vast landscape",
         model="minimax/hailuo-02",
         width=1366,
@@ -49,7 +51,7 @@ def wait_for_video(job_id: str, poll_interval: int = 5, timeout: int = 600) -> s
     """Poll a video job until completion. Returns the video URL."""
     elapsed = 0
     while elapsed < timeout:
-        status = client.videos.retrieve(job_id)
+        status = get_client().videos.retrieve(job_id)
         print(f"  Status: {status.status}")
 
         if status.status == "completed":
@@ -59,8 +61,8 @@ def wait_for_video(job_id: str, poll_interval: int = 5, timeout: int = 600) -> s
             print(f"URL: {video_url}")
             return video_url
         elif status.status == "failed":
-            errors = getattr(status.info, "errors", None)
-            raise RuntimeError(f"Video generation failed: {errors}")
+            error = status.error.message if status.error else None
+            raise RuntimeError(f"Video generation failed: {error}")
 
         time.sleep(poll_interval)
         elapsed += poll_interval
@@ -71,10 +73,6 @@ def wait_for_video(job_id: str, poll_interval: int = 5, timeout: int = 600) -> s
 if __name__ == "__main__":
     video_url = generate_text_to_video()
 
-    # Download the video
-    import requests
-
-    response = requests.get(video_url)
-    with open("output.mp4", "wb") as f:
-        f.write(response.content)
+    # Stream the video to disk in chunks (resumes if interrupted)
+    asyncio.run(download_video(video_url, "output.mp4"))
     print("Saved to output.mp4")
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Together AI Video Job Manager — Many Jobs, One Polling Loop (v2 SDK)
+
+Submit many video jobs with bounded concurrency and track them all from
+a single polling loop instead of one sleeping waiter per job. Each job
+gets its own adaptive interval: once a few jobs of a model have
+finished, the rest are polled around their expected finish time; until
+then (or once a job runs late) the interval backs off exponentially,
+with jitter so a large submission doesn't poll in lockstep. Finished
+videos are streamed to disk in chunks while other jobs are still
+rendering.
+
+Downloads go to `<name>.mp4.part` and are renamed into place when
+complete; an interrupted download continues with a byte-range request.
+Submitted job ids are appended to `out_dir/jobs.jsonl`, so rerunning
+the same specs picks up existing jobs instead of paying for new ones,
+and videos already on disk are skipped. Jobs that failed, were cancelled,
+or timed out are resubmitted on the next run.
+
+Usage:
+    python video_jobs.py specs.jsonl out/ [--submit 8]
+
+    specs.jsonl lines: {"name": "intro", "prompt": "...", "model": "...", ...}
+    (any `videos.create` parameter; `name` defaults to the line number)
+
+Requires:
+    pip install together
+    export TOGETHER_API_KEY=your_key
+"""
+
+import asyncio
+import heapq
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+import httpx
+
+from _together_client import get_async_client
+
+DEFAULT_MODEL = "google/veo-3.0"
+CHUNK_SIZE = 1024 * 1024
+# Any other status (queued, in_progress, ...) means the job is still going.
+FAILED_STATUSES = ("failed", "cancelled")
+
+
+def next_poll_delay(
+    age: float,
+    delay: float,
+    expected: float | None,
+    min_delay: float = 2.0,
+    max_delay: float = 60.0,
+) -> float:
+    """Pick the next polling interval for one job that has been running `age` seconds.
+
+    With an `expected` duration (from finished jobs of the same model)
+    and the job not yet overdue, aim to poll about twice before the
+    projected finish; otherwise back off exponentially from `delay`.
+    """
+    if expected is not None and age < expected:
+        target = (expected - age) / 2
+    else:
+        target = delay * 2
+    target = min(max_delay, max(min_delay, target))
+    return target * random.uniform(0.8, 1.2)
+
+
+async def download_video(
+    url: str,
+    path: str,
+    http: httpx.AsyncClient | None = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> int:
+    """Stream `url` to `path` in chunks. Returns the file size.
+
+    Bytes land in `path + ".part"`, which is renamed into place once the
+    body is complete. A leftover `.part` from an earlier attempt is
+    continued with a byte-range request; if the server ignores the range
+    the download restarts.
+    """
+    part = f"{path}.part"
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    own_client = http is None
+    http = http or httpx.AsyncClient(timeout=httpx.Timeout(60.0, connect=10.0), follow_redirects=True)
+    try:
+        async with http.stream("GET", url, headers=headers) as response:
+            # 416: the partial file already holds every byte.
+            if not (offset and response.status_code == 416):
+                response.raise_for_status()
+                if offset and response.status_code != 206:
+                    offset = 0
+                with open(part, "ab" if offset else "wb") as f:
+                    async for chunk in response.aiter_bytes(chunk_size):
+                        f.write(chunk)
+    finally:
+        if own_client:
+            await http.aclose()
+    os.replace(part, path)
+    return os.path.getsize(path)
+
+
+class _Job:
+    def __init__(self, name: str, params: dict, path: str):
+        self.name = name
+        self.params = params
+        self.path = path
+        self.id: str | None = None
+        self.submitted: float | None = None  # Unix time the job was created
+        self.delay = 0.0
+        self.polls = 0
+
+
+class VideoJobManager:
+    """Submit video jobs, poll them from one loop, and download results as they finish."""
+
+    def __init__(
+        self,
+        out_dir: str,
+        max_submits: int = 8,
+        max_polls: int = 16,
+        max_downloads: int = 4,
+        min_delay: float = 2.0,
+        max_delay: float = 60.0,
+        timeout: float = 1800.0,
+    ):
+        self.out_dir = out_dir
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self._submit_slots = asyncio.Semaphore(max_submits)
+        self._poll_slots = asyncio.Semaphore(max_polls)
+        self._download_slots = asyncio.Semaphore(max_downloads)
+        self._durations: dict[str, list[float]] = {}
+        self.results: dict[str, str] = {}
+        self.counters = {"submitted": 0, "reattached": 0, "skipped": 0, "polls": 0,
+                         "completed": 0, "failed": 0, "bytes": 0}
+
+    def expected_duration(self, model: str) -> float | None:
+        """Median render time of this model's finished jobs, once there are at least two."""
+        durations = self._durations.get(model, [])
+        return statistics.median(durations) if len(durations) >= 2 else None
+
+    def _load_jobs(self) -> dict[str, dict]:
+        """Latest {"id", "submitted"} entry per name, minus jobs marked for resubmission."""
+        path = os.path.join(self.out_dir, "jobs.jsonl")
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            entries = {entry["name"]: entry for entry in map(json.loads, f)}
+        return {name: entry for name, entry in entries.items() if entry["id"]}
+
+    def _fail(self, job: _Job, error: str):
+        self.counters["failed"] += 1
+        self.results[job.name] = f"error: {error}"
+        print(f"  FAIL  {job.name}: {error}")
+
+    def _record(self, job: _Job, job_id: str | None):
+        entry = {"name": job.name, "id": job_id, "submitted": job.submitted if job_id else None}
+        self._log.write(json.dumps(entry) + "\n")
+        self._log.flush()
+
+    async def _submit(self, job: _Job):
+        async with self._submit_slots:
+            created = await get_async_client().videos.create(**job.params)
+        job.id, job.submitted = created.id, created.created_at
+        self._record(job, job.id)
+        self.counters["submitted"] += 1
+
+    async def _poll(self, job: _Job):
+        async with self._poll_slots:
+            status = await get_async_client().videos.retrieve(job.id)
+        job.polls += 1
+        self.counters["polls"] += 1
+        return status
+
+    async def _download(self, job: _Job, url: str, http: httpx.AsyncClient):
+        try:
+            async with self._download_slots:
+                size = await download_video(url, job.path, http)
+        except Exception as e:
+            self._fail(job, f"download failed: {e}")
+            return
+        self.counters["completed"] += 1
+        self.counters["bytes"] += size
+        self.results[job.name] = job.path
+        print(f"  done  {job.name} -> {job.path} ({size / 1e6:.1f} MB, {job.polls} polls)")
+
+    async def run(self, specs: list[dict]) -> dict[str, str]:
+        """Render every spec into `out_dir/<name>.mp4`. Returns {name: path or error message}."""
+        os.makedirs(self.out_dir, exist_ok=True)
+        known = self._load_jobs()
+        jobs = []
+        for i, spec in enumerate(specs):
+            spec = dict(spec)
+            name = str(spec.pop("name", i))
+            spec.setdefault("model", DEFAULT_MODEL)
+            job = _Job(name, spec, os.path.join(self.out_dir, f"{name}.mp4"))
+            if os.path.exists(job.path):
+                self.counters["skipped"] += 1
+                self.results[name] = job.path
+                continue
+            if name in known:
+                job.id, job.submitted = known[name]["id"], known[name].get("submitted")
+            jobs.append(job)
+
+        started = time.monotonic()
+        with open(os.path.join(self.out_dir, "jobs.jsonl"), "a") as self._log:
+            await self._track(jobs)
+        elapsed = time.monotonic() - started
+        print(f"Video jobs: {dict(self.counters, seconds=round(elapsed, 1))}")
+        return self.results
+
+    async def _track(self, jobs: list[_Job]):
+        new = [job for job in jobs if job.id is None]
+        outcomes = await asyncio.gather(*(self._submit(job) for job in new), return_exceptions=True)
+        for job, outcome in zip(new, outcomes):
+            if isinstance(outcome, BaseException):
+                self._fail(job, f"submit failed: {outcome}")
+        self.counters["reattached"] = len(jobs) - len(new)
+
+        now = time.monotonic()
+        due: list[tuple[float, int, _Job]] = []
+        for i, job in enumerate(jobs):
+            if job.id is not None:
+                # Ages use the job's real creation time, so a rerun neither restarts
+                # `timeout` nor under-reports render times; jobs logged without one
+                # are dated from now until their first successful poll.
+                job.submitted = job.submitted or time.time()
+                job.delay = self.min_delay
+                heapq.heappush(due, (now + self.min_delay, i, job))
+
+        downloads = []
+        async with httpx.AsyncClient(timeout=httpx.Timeout(60.0, connect=10.0), follow_redirects=True) as http:
+            while due:
+                await asyncio.sleep(max(0.0, due[0][0] - time.monotonic()))
+                now = time.monotonic()
+                batch = []
+                while due and due[0][0] <= now:
+                    batch.append(heapq.heappop(due))
+                statuses = await asyncio.gather(*(self._poll(job) for _, _, job in batch), return_exceptions=True)
+
+                now = time.monotonic()
+                for (_, i, job), status in zip(batch, statuses):
+                    if not isinstance(status, BaseException):
+                        job.submitted = status.created_at
+                    age = time.time() - job.submitted
+                    state = None if isinstance(status, BaseException) else status.status
+                    if state == "completed":
+                        render_time = status.completed_at - status.created_at if status.completed_at else age
+                        self._durations.setdefault(job.params["model"], []).append(render_time)
+                        downloads.append(asyncio.create_task(self._download(job, status.outputs.video_url, http)))
+                    elif state in FAILED_STATUSES:
+                        error = status.error.message if status.error else state
+                        self._record(job, None)
+                        self._fail(job, f"job {job.id}: {error}")
+                    elif age > self.timeout:
+                        self._record(job, None)
+                        self._fail(job, f"job {job.id} did not complete within {self.timeout:.0f}s")
+                    else:
+                        # Render-time estimates only apply once the job is actually rendering.
+                        expected = self.expected_duration(job.params["model"]) if state == "in_progress" else None
+                        job.delay = next_poll_delay(age, job.delay, expected, self.min_delay, self.max_delay)
+                        heapq.heappush(due, (now + job.delay, i, job))
+            await asyncio.gather(*downloads)
+
+
+def _load_specs(path: str) -> list[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python video_jobs.py <specs.jsonl> <out_dir> [--submit N]")
+        sys.exit(1)
+
+    flags = sys.argv[3:]
+    submits = int(flags[flags.index("--submit") + 1]) if "--submit" in flags else 8
+    manager = VideoJobManager(sys.argv[2], max_submits=submits)
+    asyncio.run(manager.run(_load_specs(sys.argv[1])))
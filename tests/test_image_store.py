@@ -0,0 +1,62 @@
+"""generate_image.py with an ImageStore, against a mocked images endpoint."""
+
+import base64
+import json
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "skills" / "together-images" / "scripts"))
+
+import _together_client  # noqa: E402
+from generate_image import generate_and_save, generate_image_url  # noqa: E402
+from image_store import ImageStore  # noqa: E402
+
+PIXELS = b"\x89PNG\r\n\x1a\n fake image bytes"
+
+
+@pytest.fixture
+def requests():
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(json.loads(request.content))
+        return httpx.Response(200, json={"data": [{"b64_json": base64.b64encode(PIXELS).decode()}]})
+
+    _together_client.configure(
+        transport=httpx.MockTransport(handler), api_key="test", base_url="http://test/v1", max_retries=0
+    )
+    yield seen
+    _together_client.configure()
+
+
+def test_generate_and_save_renders_once_into_store(tmp_path, requests):
+    store = ImageStore(str(tmp_path / "store"))
+    for name in ("a.png", "b.png"):
+        generate_and_save("a lighthouse", str(tmp_path / name), seed=7, store=store)
+        assert (tmp_path / name).read_bytes() == PIXELS
+
+    assert len(requests) == 1
+    assert requests[0]["seed"] == 7 and requests[0]["n"] == 1
+    assert requests[0]["response_format"] == "base64"
+    assert store.stats() == {"hits": 1, "misses": 1, "coalesced": 0}
+
+
+def test_generate_and_save_shares_store_entries_with_urls(tmp_path, requests):
+    store = ImageStore(str(tmp_path / "store"))
+    generate_and_save("a lighthouse", str(tmp_path / "a.png"), seed=7, store=store)
+    [url] = generate_image_url("a lighthouse", seed=7, store=store)
+
+    assert len(requests) == 1
+    assert Path(url.removeprefix("file://")).read_bytes() == PIXELS
+
+
+def test_unseeded_generate_and_save_bypasses_store(tmp_path, requests):
+    store = ImageStore(str(tmp_path / "store"))
+    generate_and_save("a lighthouse", str(tmp_path / "a.png"), store=store)
+    generate_and_save("a lighthouse", str(tmp_path / "b.png"), store=store)
+
+    assert len(requests) == 2
+    assert not (tmp_path / "store").exists()
@@ -0,0 +1,167 @@
+"""video_jobs.py against a local HTTP stub of the videos API and its file host."""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "skills" / "together-video" / "scripts"))
+
+import _together_client  # noqa: E402
+import video_jobs  # noqa: E402
+
+VIDEO = bytes(range(256)) * 4096  # 1 MiB
+
+
+class VideoStub(ThreadingHTTPServer):
+    """Serves POST/GET /v1/videos and the finished files.
+
+    Each job walks through `script[prompt]`, one status per poll, staying
+    on the last one. The job's creation time can be backdated via `age`.
+    """
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.url = f"http://127.0.0.1:{self.server_address[1]}"
+        self.jobs: dict[str, dict] = {}
+        self.script: dict[str, list[str]] = {}
+        self.ranges: list[str] = []
+
+    def add_job(self, job_id: str, prompt: str, age: float = 0.0) -> dict:
+        job = self.jobs[job_id] = {"prompt": prompt, "created_at": time.time() - age, "polls": 0}
+        return job
+
+    def status(self, job_id: str) -> dict:
+        job = self.jobs[job_id]
+        steps = self.script.get(job["prompt"], ["completed"])
+        state = steps[min(job["polls"], len(steps) - 1)]
+        body = {"id": job_id, "object": "video", "model": "m", "seconds": "4", "size": "1x1",
+                "created_at": job["created_at"], "status": state}
+        if state == "completed":
+            body["completed_at"] = job["created_at"] + 1
+            body["outputs"] = {"cost": 1, "video_url": f"{self.url}/files/{job_id}.mp4"}
+        elif state == "failed":
+            body["error"] = {"message": "content policy"}
+        return body
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, code: int, body: bytes, content_type: str = "application/json"):
+        self.send_response(code)
+        self.send_header("content-type", content_type)
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        params = json.loads(self.rfile.read(int(self.headers["content-length"])))
+        job_id = f"job-{len(self.server.jobs)}"
+        self.server.add_job(job_id, params["prompt"])
+        self._send(200, json.dumps(self.server.status(job_id)).encode())
+
+    def do_GET(self):
+        if self.path.startswith("/v1/videos/"):
+            job_id = self.path.rsplit("/", 1)[1]
+            body = self.server.status(job_id)
+            self.server.jobs[job_id]["polls"] += 1
+            return self._send(200, json.dumps(body).encode())
+        byte_range = self.headers.get("Range")
+        if not byte_range:
+            return self._send(200, VIDEO, "video/mp4")
+        self.server.ranges.append(byte_range)
+        start = int(byte_range.removeprefix("bytes=").rstrip("-"))
+        if start >= len(VIDEO):
+            return self._send(416, b"", "video/mp4")
+        self._send(206, VIDEO[start:], "video/mp4")
+
+
+@pytest.fixture
+def stub():
+    server = VideoStub()
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    _together_client.configure(api_key="test", base_url=f"{server.url}/v1", max_retries=0)
+    yield server
+    _together_client.configure()
+    server.shutdown()
+    server.server_close()
+
+
+def run(out_dir, specs, **kwargs) -> video_jobs.VideoJobManager:
+    manager = video_jobs.VideoJobManager(str(out_dir), min_delay=0.01, max_delay=0.05, **kwargs)
+    asyncio.run(manager.run(specs))
+    return manager
+
+
+def log_entries(out_dir) -> list[dict]:
+    with open(out_dir / "jobs.jsonl") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_queued_and_in_progress_jobs_keep_polling(stub, tmp_path):
+    stub.script["slow"] = ["queued", "queued", "in_progress", "in_progress", "completed"]
+    manager = run(tmp_path, [{"name": "a", "prompt": "slow"}])
+
+    assert manager.results == {"a": str(tmp_path / "a.mp4")}
+    assert (tmp_path / "a.mp4").read_bytes() == VIDEO
+    assert manager.counters["failed"] == 0 and manager.counters["polls"] == 5
+
+
+@pytest.mark.parametrize("state", ["failed", "cancelled"])
+def test_terminal_failures_are_marked_for_resubmission(stub, tmp_path, state):
+    stub.script["bad"] = ["queued", state]
+    manager = run(tmp_path, [{"name": "a", "prompt": "bad"}])
+
+    assert manager.results["a"].startswith("error: job job-0")
+    assert [entry["id"] for entry in log_entries(tmp_path)] == ["job-0", None]
+
+    stub.script["bad"] = ["completed"]
+    manager = run(tmp_path, [{"name": "a", "prompt": "bad"}])
+    assert manager.counters["submitted"] == 1 and manager.results["a"] == str(tmp_path / "a.mp4")
+
+
+def test_rerun_reattaches_and_skips_finished_videos(stub, tmp_path):
+    stub.script["slow"] = ["in_progress"]
+    specs = [{"name": "done", "prompt": "fast"}, {"name": "pending", "prompt": "slow"}]
+    run(tmp_path, specs, timeout=0.2)
+    assert (tmp_path / "done.mp4").exists() and not (tmp_path / "pending.mp4").exists()
+
+    stub.script["slow"] = ["completed"]
+    manager = run(tmp_path, specs)
+    assert manager.counters["skipped"] == 1
+    assert manager.counters["submitted"] == 1  # the timed-out job is resubmitted, not the finished one
+    assert (tmp_path / "pending.mp4").read_bytes() == VIDEO
+
+
+def test_reattached_job_ages_from_its_creation_time(stub, tmp_path):
+    stub.script["stuck"] = ["in_progress"]
+    stub.add_job("old", "stuck", age=100)
+    with open(tmp_path / "jobs.jsonl", "w") as f:
+        f.write(json.dumps({"name": "a", "id": "old", "submitted": time.time()}) + "\n")
+
+    started = time.monotonic()
+    manager = run(tmp_path, [{"name": "a", "prompt": "stuck"}], timeout=50)
+
+    assert time.monotonic() - started < 5
+    assert manager.results["a"] == "error: job old did not complete within 50s"
+    assert manager.counters["submitted"] == 0
+
+
+def test_download_resumes_partial_file(stub, tmp_path):
+    path = str(tmp_path / "v.mp4")
+    with open(f"{path}.part", "wb") as f:
+        f.write(VIDEO[:1000])
+
+    assert asyncio.run(video_jobs.download_video(f"{stub.url}/files/v.mp4", path)) == len(VIDEO)
+    assert Path(path).read_bytes() == VIDEO and not os.path.exists(f"{path}.part")
+    assert stub.ranges == ["bytes=1000-"]